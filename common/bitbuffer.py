@@ -0,0 +1,86 @@
+import numpy as np
+
+class BitBuffer:
+    # последовательность бит (MSB первым), хранимая упакованно: 1 бит на бит
+    def __init__(self, bits=()):
+        if isinstance(bits, BitBuffer):
+            self.data = bits.data
+            self.length = bits.length
+            return
+        arr = np.asarray(bits, dtype=np.uint8).ravel()
+        self.data = np.packbits(arr & 1)
+        self.length = arr.size
+
+    @classmethod
+    def from_bytes(cls, data, length: int = None) -> "BitBuffer":
+        buf = cls.__new__(cls)
+        if isinstance(data, np.ndarray):
+            packed = data.astype(np.uint8, copy=False)
+        else:
+            packed = np.frombuffer(bytes(data), dtype=np.uint8)
+        if length is None:
+            length = packed.size * 8
+        packed = packed[:(length + 7) // 8].copy()
+        if length % 8:
+            packed[-1] &= (0xFF << (8 - length % 8)) & 0xFF
+        buf.data = packed
+        buf.length = length
+        return buf
+
+    @classmethod
+    def from_text(cls, text: str, marker: bytes = b"") -> "BitBuffer":
+        return cls.from_bytes(text.encode('utf-8', errors='replace') + marker)
+
+    @classmethod
+    def zeros(cls, length: int) -> "BitBuffer":
+        return cls.from_bytes(np.zeros((length + 7) // 8, dtype=np.uint8), length)
+
+    def unpacked(self) -> np.ndarray:
+        return np.unpackbits(self.data, count=self.length)
+
+    def to_bytes(self) -> bytes:
+        return self.data.tobytes()
+
+    def find_marker(self, marker: bytes, start: int = 0) -> int:
+        # поиск по границам байт, как в bits_to_text_with_marker; возвращает индекс бита
+        idx = self.to_bytes().find(marker, (start + 7) // 8)
+        return -1 if idx < 0 else idx * 8
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step == 1 and start % 8 == 0:
+                return BitBuffer.from_bytes(self.data[start // 8:(stop + 7) // 8], max(0, stop - start))
+            return BitBuffer(self.unpacked()[key])
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError("индекс бита вне диапазона")
+        return int(self.data[key >> 3] >> (7 - (key & 7))) & 1
+
+    def __add__(self, other) -> "BitBuffer":
+        other = BitBuffer(other)
+        if self.length % 8 == 0:
+            return BitBuffer.from_bytes(np.concatenate((self.data, other.data)), self.length + other.length)
+        return BitBuffer(np.concatenate((self.unpacked(), other.unpacked())))
+
+    def __radd__(self, other) -> "BitBuffer":
+        return BitBuffer(other) + self
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, BitBuffer):
+            return NotImplemented
+        return self.length == other.length and np.array_equal(self.data, other.data)
+
+    def __iter__(self):
+        return iter(self.unpacked().tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self.unpacked()
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __repr__(self) -> str:
+        return f"BitBuffer(length={self.length})"
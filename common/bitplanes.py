@@ -0,0 +1,176 @@
+import os
+import struct
+import numpy as np
+from PyQt6.QtGui import QImage, QImageReader
+
+from common.qt_arrays import gray_view, red_view, array_to_qimage
+
+
+def bit_planes(gray: np.ndarray) -> np.ndarray:
+    # все восемь плоскостей за один проход: planes[b] = 255 там, где бит b равен 1
+    planes = np.unpackbits(gray[np.newaxis], axis=0, bitorder='little')
+    np.multiply(planes, 255, out=planes)
+    return planes
+
+
+def bit_plane(gray: np.ndarray, bit: int) -> np.ndarray:
+    plane = np.right_shift(gray, bit) & 1
+    np.multiply(plane, 255, out=plane)
+    return plane
+
+
+def bit_plane_images(image: QImage) -> list[QImage]:
+    if image.isNull():
+        return [QImage() for _ in range(8)]
+    planes = bit_planes(red_view(image))
+    return [array_to_qimage(planes[b]) for b in range(8)]
+
+
+def create_bit_image(image: QImage, bit: int) -> QImage:
+    if image.isNull():
+        return QImage()
+    return array_to_qimage(bit_plane(red_view(image), bit))
+
+
+# Упакованный формат: заголовок PACKED_HEADER, затем восемь плоскостей
+# (бит 0 первым), каждая строка упакована np.packbits и дополнена до 4 байт,
+# так что плоскость совпадает с раскладкой QImage.Format_Mono.
+PACKED_MAGIC = b"BPLN"
+PACKED_VERSION = 1
+PACKED_HEADER = struct.Struct("<4sB3xII")
+
+
+def packed_row_bytes(width: int) -> int:
+    return (width + 31) // 32 * 4
+
+
+def save_packed_planes(path: str, gray: np.ndarray) -> None:
+    height, width = gray.shape
+    stride = packed_row_bytes(width)
+    row = np.zeros((height, stride), dtype=np.uint8)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, width, height))
+            for b in range(8):
+                packed = np.packbits(np.right_shift(gray, b) & 1, axis=1)
+                row[:, :packed.shape[1]] = packed
+                f.write(row.tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class PackedBitPlanes:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            header = f.read(PACKED_HEADER.size)
+        if len(header) < PACKED_HEADER.size:
+            raise ValueError(f"Файл слишком короткий: {path}")
+        magic, version, width, height = PACKED_HEADER.unpack(header)
+        if magic != PACKED_MAGIC or version != PACKED_VERSION:
+            raise ValueError(f"Неизвестный формат битовых плоскостей: {path}")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.stride = packed_row_bytes(width)
+        self.data = np.memmap(path, dtype=np.uint8, mode="r", offset=PACKED_HEADER.size,
+                              shape=(8, height, self.stride))
+
+    def packed_plane(self, bit: int) -> np.ndarray:
+        return self.data[bit]
+
+    def plane(self, bit: int) -> np.ndarray:
+        bits = np.unpackbits(self.data[bit], axis=1, count=self.width)
+        np.multiply(bits, 255, out=bits)
+        return bits
+
+    def plane_image(self, bit: int) -> QImage:
+        if self.width == 0 or self.height == 0:
+            return QImage()
+        image = QImage(self.data[bit], self.width, self.height, self.stride, QImage.Format.Format_Mono)
+        image.setColorTable([0xFF000000, 0xFFFFFFFF])
+        return image
+
+
+def read_pgm_header(path: str):
+    # возвращает (width, height, offset) для бинарного 8-битного PGM (P5), иначе None
+    with open(path, "rb") as f:
+        head = f.read(1024)
+    if not head.startswith(b"P5"):
+        return None
+    fields, pos = [], 2
+    while len(fields) < 3:
+        while pos < len(head) and head[pos:pos + 1].isspace():
+            pos += 1
+        if head[pos:pos + 1] == b"#":
+            while pos < len(head) and head[pos:pos + 1] not in (b"\n", b"\r"):
+                pos += 1
+            continue
+        start = pos
+        while pos < len(head) and head[pos:pos + 1].isdigit():
+            pos += 1
+        if start == pos:
+            return None
+        fields.append(int(head[start:pos]))
+    width, height, maxval = fields
+    if maxval > 255:
+        return None
+    return width, height, pos + 1
+
+
+def image_size(path: str) -> tuple[int, int]:
+    header = read_pgm_header(path)
+    if header is not None:
+        return header[0], header[1]
+    size = QImageReader(path).size()
+    return size.width(), size.height()
+
+
+def iter_gray_strips(path: str, strip_rows: int = 256):
+    # полосами с диска читается только PGM (memmap); остальные форматы
+    # декодируются один раз целиком и режутся на полосы уже в памяти
+    header = read_pgm_header(path)
+    if header is not None:
+        width, height, offset = header
+        if os.path.getsize(path) < offset + width * height:
+            raise OSError(f"PGM-файл обрезан: {path}")
+        data = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(height, width))
+        for y in range(0, height, strip_rows):
+            yield y, np.asarray(data[y:y + strip_rows])
+        return
+    image = QImage(path)
+    if image.isNull():
+        raise OSError(f"Не удалось прочитать изображение: {path}")
+    gray = gray_view(image)
+    for y in range(0, gray.shape[0], strip_rows):
+        yield y, gray[y:y + strip_rows]
+
+
+def stream_packed_planes(src_path: str, dst_path: str, strip_rows: int = 256) -> None:
+    width, height = image_size(src_path)
+    if width <= 0 or height <= 0:
+        raise OSError(f"Не удалось определить размер изображения: {src_path}")
+    stride = packed_row_bytes(width)
+    # полосы пишутся во временный файл рядом с dst_path: при ошибке посреди чтения
+    # не остаётся недописанного .bpl, который инкрементальный экспорт счёл бы актуальным
+    tmp_path = dst_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, width, height))
+        out = np.memmap(tmp_path, dtype=np.uint8, mode="r+", offset=PACKED_HEADER.size,
+                        shape=(8, height, stride))
+        for y, gray in iter_gray_strips(src_path, strip_rows):
+            rows = gray.shape[0]
+            bits = np.unpackbits(gray[np.newaxis], axis=0, bitorder='little')
+            packed = np.packbits(bits, axis=2)
+            out[:, y:y + rows, :packed.shape[2]] = packed
+            out.flush()
+        del out
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,25 @@
+import numpy as np
+
+def decode_until_marker(bit_chunks, marker: bytes) -> bytes:
+    # собирает байты из потока кусков бит (MSB первым) и останавливается,
+    # как только в данных встретился маркер; хвост без маркера добивается нулями
+    raw = bytearray()
+    pending = np.empty(0, dtype=np.uint8)
+    for chunk in bit_chunks:
+        bits = np.concatenate((pending, np.asarray(chunk, dtype=np.uint8)))
+        full = bits.size - bits.size % 8
+        pending = bits[full:]
+        if not full:
+            continue
+        start = max(0, len(raw) - len(marker) + 1)
+        raw += np.packbits(bits[:full]).tobytes()
+        idx = raw.find(marker, start)
+        if idx >= 0:
+            return bytes(raw[:idx])
+    if pending.size:
+        start = max(0, len(raw) - len(marker) + 1)
+        raw += np.packbits(pending).tobytes()
+        idx = raw.find(marker, start)
+        if idx >= 0:
+            return bytes(raw[:idx])
+    return bytes(raw)
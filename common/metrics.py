@@ -0,0 +1,51 @@
+import math
+from dataclasses import dataclass
+import numpy as np
+from PyQt6.QtGui import QImage
+
+from common.qt_arrays import gray_view, rgb_view, array_to_qimage
+
+_LEVELS = np.arange(256, dtype=np.int64)
+
+@dataclass
+class ImageMetrics:
+    mae: float
+    mse: float
+    psnr: float
+    max_error: int
+    changed: int
+    changed_mae: float
+    diff: np.ndarray
+
+    def diff_image(self) -> QImage:
+        return array_to_qimage(self.diff)
+
+def channel_view(image: QImage, channel: str) -> np.ndarray:
+    if channel == "gray":
+        return gray_view(image)
+    if channel == "blue":
+        return rgb_view(image)[:, :, 2]
+    raise ValueError(f"Неизвестный канал: {channel}")
+
+def compare_arrays(cover: np.ndarray, stego: np.ndarray, positions: np.ndarray = None) -> ImageMetrics:
+    diff = np.abs(cover.astype(np.int16) - stego).astype(np.uint8)
+    # все скалярные метрики считаются по гистограмме модулей разности
+    hist = np.bincount(diff.ravel(), minlength=256)
+    count = diff.size
+    abs_sum = int(hist @ _LEVELS)
+    sq_sum = int(hist @ (_LEVELS * _LEVELS))
+    mae = abs_sum / count if count else 0.0
+    mse = sq_sum / count if count else 0.0
+    psnr = float('inf') if mse == 0 else 10 * math.log10((255 ** 2) / mse)
+    nonzero = np.flatnonzero(hist)
+    max_error = int(nonzero[-1]) if nonzero.size else 0
+    changed = count - int(hist[0])
+    changed_mae = 0.0
+    if positions is not None and len(positions):
+        changed_mae = int(diff.ravel()[positions].sum(dtype=np.int64)) / len(positions)
+    return ImageMetrics(mae, mse, psnr, max_error, changed, changed_mae, diff)
+
+def compare_images(cover: QImage, stego: QImage, channel: str = "gray", positions: np.ndarray = None):
+    if cover.isNull() or stego.isNull() or cover.size() != stego.size():
+        return None
+    return compare_arrays(channel_view(cover, channel), channel_view(stego, channel), positions)
@@ -0,0 +1,125 @@
+import numpy as np
+from PyQt6.QtGui import QImage
+
+_CHANNELS = {
+    QImage.Format.Format_Grayscale8: 1,
+    QImage.Format.Format_RGB888: 3,
+}
+
+
+class _ImageBuffer:
+    # держит ссылку на QImage, пока жив ndarray, построенный поверх его буфера
+    def __init__(self, image: QImage, writable: bool):
+        self.image = image
+        ptr = image.bits() if writable else image.constBits()
+        self.__array_interface__ = {
+            "shape": (image.height(), image.bytesPerLine()),
+            "typestr": "|u1",
+            "data": (int(ptr), not writable),
+            "version": 3,
+        }
+
+
+def image_view(image: QImage, fmt: QImage.Format, writable: bool = False) -> np.ndarray:
+    if isinstance(image, ImageHandle):
+        if not writable:
+            return image.view(fmt)
+        image.invalidate()
+        image = image.image
+    channels = _CHANNELS[fmt]
+    if image.isNull():
+        shape = (0, 0) if channels == 1 else (0, 0, channels)
+        return np.zeros(shape, dtype=np.uint8)
+    if image.format() != fmt:
+        if writable:
+            # запись в представление временной копии молча потерялась бы
+            raise ValueError(f"Изменяемое представление требует формат {fmt.name}, а не {image.format().name}")
+        image = image.convertToFormat(fmt)
+    width, height = image.width(), image.height()
+    arr = np.asarray(_ImageBuffer(image, writable))[:, :width * channels]
+    if channels > 1:
+        arr = arr.reshape(height, width, channels)
+    return arr
+
+
+class ImageHandle:
+    # QImage с кэшем конверсий формата и их ndarray-представлений;
+    # кэш сбрасывается при замене картинки или изменении её содержимого (cacheKey).
+    # Запись через изменяемый ndarray (image_view(..., writable=True)) cacheKey не меняет:
+    # кэш сбрасывается при выдаче такого представления, а после записи нужно вызвать invalidate()
+    def __init__(self, image: QImage = None):
+        self.image = QImage() if image is None else image
+
+    @property
+    def image(self) -> QImage:
+        return self._image
+
+    @image.setter
+    def image(self, image: QImage):
+        self._image = image
+        self.invalidate()
+
+    def invalidate(self):
+        self._key = self._image.cacheKey()
+        self._converted = {}
+        self._views = {}
+
+    def _check(self):
+        if self._image.cacheKey() != self._key:
+            self.invalidate()
+
+    def converted(self, fmt: QImage.Format) -> QImage:
+        self._check()
+        if self._image.format() == fmt:
+            return self._image
+        if fmt not in self._converted:
+            self._converted[fmt] = self._image.convertToFormat(fmt)
+        return self._converted[fmt]
+
+    def view(self, fmt: QImage.Format) -> np.ndarray:
+        self._check()
+        if fmt not in self._views:
+            self._views[fmt] = image_view(self.converted(fmt), fmt)
+        return self._views[fmt]
+
+    def isNull(self) -> bool:
+        return self._image.isNull()
+
+    def width(self) -> int:
+        return self._image.width()
+
+    def height(self) -> int:
+        return self._image.height()
+
+    def size(self):
+        return self._image.size()
+
+
+
+def gray_view(image: QImage, writable: bool = False) -> np.ndarray:
+    return image_view(image, QImage.Format.Format_Grayscale8, writable)
+
+
+def rgb_view(image: QImage, writable: bool = False) -> np.ndarray:
+    return image_view(image, QImage.Format.Format_RGB888, writable)
+
+
+def red_view(image: QImage) -> np.ndarray:
+    # то же, что QColor(image.pixel(x, y)).red() для каждого пикселя
+    if image.format() == QImage.Format.Format_Grayscale8:
+        return gray_view(image)
+    return rgb_view(image)[:, :, 0]
+
+
+def array_to_qimage(arr: np.ndarray) -> QImage:
+    if arr.ndim == 2:
+        fmt = QImage.Format.Format_Grayscale8
+    elif arr.ndim == 3 and arr.shape[2] == 3:
+        fmt = QImage.Format.Format_RGB888
+    else:
+        raise ValueError(f"Неподдерживаемая форма массива: {arr.shape}")
+    if arr.size == 0:
+        return QImage()
+    arr = np.ascontiguousarray(arr, dtype=np.uint8)
+    height, width = arr.shape[:2]
+    return QImage(arr, width, height, arr.strides[0], fmt)
@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+import numpy as np
+
+from common.bitbuffer import BitBuffer
+
+# расстояние правки считается точно только до этого порога, дальше - "> EDIT_DISTANCE_MAX"
+EDIT_DISTANCE_MAX = 128
+
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1).astype(np.uint8)
+
+@dataclass
+class ExtractionScore:
+    bit_errors: int
+    total_bits: int
+    length_diff: int
+    edit_distance: int
+    region_density: np.ndarray
+
+    @property
+    def ber(self) -> float:
+        return self.bit_errors / self.total_bits if self.total_bits else 0.0
+
+def _trim_common(a: bytes, b: bytes) -> tuple[bytes, bytes]:
+    x = np.frombuffer(a, dtype=np.uint8)
+    y = np.frombuffer(b, dtype=np.uint8)
+    k = min(x.size, y.size)
+    mismatch = np.flatnonzero(x[:k] != y[:k])
+    prefix = int(mismatch[0]) if mismatch.size else k
+    x, y = x[prefix:], y[prefix:]
+    k = min(x.size, y.size)
+    mismatch = np.flatnonzero(x[x.size - k:][::-1] != y[y.size - k:][::-1])
+    suffix = int(mismatch[0]) if mismatch.size else k
+    return x[:x.size - suffix].tobytes(), y[:y.size - suffix].tobytes()
+
+def _common_run(x: np.ndarray, y: np.ndarray, i: int, j: int) -> int:
+    # длина общего участка x[i:] и y[j:]: сравнение блоками растущего размера
+    limit = min(x.size - i, y.size - j)
+    k = 0
+    chunk = 16
+    while k < limit:
+        end = min(limit, k + chunk)
+        mismatch = np.flatnonzero(x[i + k:i + end] != y[j + k:j + end])
+        if mismatch.size:
+            return k + int(mismatch[0])
+        k = end
+        chunk *= 2
+    return k
+
+def edit_distance(a: bytes, b: bytes, max_distance: int = EDIT_DISTANCE_MAX):
+    # расстояние Левенштейна по байтам (Ландау-Вишкин): O(n + k^2) сравнений участков;
+    # None, если расстояние больше max_distance
+    a, b = _trim_common(a, b)
+    x = np.frombuffer(a, dtype=np.uint8)
+    y = np.frombuffer(b, dtype=np.uint8)
+    n, m = x.size, y.size
+    target = m - n
+    if abs(target) > max_distance:
+        return None
+    # furthest[diag] - наибольшая строка i на диагонали j - i = diag, достижимая за d правок
+    furthest = {0: _common_run(x, y, 0, 0)}
+    if target == 0 and furthest[0] >= n:
+        return 0
+    for d in range(1, max_distance + 1):
+        reached = {}
+        for diag in range(max(-d, -n), min(d, m) + 1):
+            i = -1
+            if diag in furthest:
+                i = furthest[diag] + 1
+            if diag - 1 in furthest:
+                i = max(i, furthest[diag - 1])
+            if diag + 1 in furthest:
+                i = max(i, furthest[diag + 1] + 1)
+            if i < 0:
+                continue
+            i = min(i, n, m - diag)
+            if i + diag < 0:
+                continue
+            reached[diag] = i + _common_run(x, y, i, i + diag)
+        furthest = reached
+        if furthest.get(target, -1) >= n:
+            return d
+    return None
+
+def score_extraction(original, extracted, regions: int = 16) -> ExtractionScore:
+    original = BitBuffer.from_bytes(original) if isinstance(original, (bytes, bytearray)) else BitBuffer(original)
+    extracted = BitBuffer.from_bytes(extracted) if isinstance(extracted, (bytes, bytearray)) else BitBuffer(extracted)
+    common_bits = min(len(original), len(extracted))
+    common_bytes = (common_bits + 7) // 8
+    # хвосты за пределами common_bits обнулены в обоих буферах после среза
+    errors = POPCOUNT[original[:common_bits].data ^ extracted[:common_bits].data]
+    length_diff = len(original) - len(extracted)
+    bit_errors = int(errors.sum(dtype=np.int64)) + abs(length_diff)
+    total_bits = max(len(original), len(extracted))
+    region_density = np.zeros(0)
+    if common_bytes:
+        bounds = np.linspace(0, common_bytes, min(regions, common_bytes) + 1).astype(np.int64)
+        counts = np.add.reduceat(errors.astype(np.int64), bounds[:-1])
+        region_density = counts / (np.diff(bounds) * 8)
+    distance = edit_distance(original.to_bytes(), extracted.to_bytes()) if length_diff else None
+    return ExtractionScore(bit_errors, total_bits, length_diff, distance, region_density)
+
+def score_message(original_text: str, extracted_payload):
+    # сравниваются извлечённые байты/биты, а не текст: после decode(errors='replace')
+    # каждый испорченный байт превращается в 3 байта U+FFFD и сдвигает всё, что за ним;
+    # None, если сравнивать не с чем
+    original_payload = original_text.encode('utf-8')
+    if not original_payload or not len(extracted_payload):
+        return None
+    return score_extraction(original_payload, extracted_payload)
+
+def format_score(score: ExtractionScore) -> str:
+    text = (
+        f"Ошибка в извлечении (BER): {score.ber * 100:.2f}%\n"
+        f"Ошибочных бит: {score.bit_errors} из {score.total_bits}"
+    )
+    if score.length_diff:
+        distance = score.edit_distance
+        if distance is None:
+            distance = f"> {EDIT_DISTANCE_MAX}"
+        text += f"\nРазница длины: {score.length_diff} бит, расстояние правки: {distance} байт"
+    if score.region_density.size:
+        worst = int(np.argmax(score.region_density))
+        text += f"\nМаксимальная плотность ошибок: {score.region_density[worst] * 100:.2f}% (участок {worst + 1} из {score.region_density.size})"
+    return text
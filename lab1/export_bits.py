@@ -0,0 +1,108 @@
+import sys, os
+import argparse
+import time
+import concurrent.futures
+from multiprocessing import cpu_count
+from PyQt6.QtGui import QImage
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.bitplanes import bit_plane_images, save_packed_planes, stream_packed_planes
+from common.qt_arrays import gray_view
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".pgm")
+
+def plane_paths(output_dir: str, file_name: str, packed: bool = False) -> list[str]:
+    base_name = os.path.splitext(file_name)[0]
+    if packed:
+        return [os.path.join(output_dir, f"{base_name}_bits.bpl").replace("\\", "/")]
+    return [os.path.join(output_dir, f"{base_name}_bit_{b}.bmp").replace("\\", "/") for b in range(8)]
+
+def is_up_to_date(input_path: str, outputs: list[str]) -> bool:
+    src_mtime = os.path.getmtime(input_path)
+    for path in outputs:
+        if not os.path.exists(path) or os.path.getmtime(path) < src_mtime:
+            return False
+    return True
+
+def export_image(task: tuple[str, list[str], bool, int]) -> tuple[str, bool]:
+    input_path, outputs, packed, strip_rows = task
+    if strip_rows:
+        try:
+            stream_packed_planes(input_path, outputs[0], strip_rows)
+        except (OSError, ValueError):
+            return input_path, False
+        return input_path, True
+    image = QImage(input_path)
+    if image.isNull():
+        return input_path, False
+    if image.format() != QImage.Format.Format_Grayscale8:
+        image = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    if packed:
+        try:
+            save_packed_planes(outputs[0], gray_view(image))
+        except OSError:
+            return input_path, False
+        return input_path, True
+    success = True
+    for path, bit_image in zip(outputs, bit_plane_images(image)):
+        if not bit_image.save(path, "BMP"):
+            success = False
+    return input_path, success
+
+def collect_tasks(input_dir: str, output_dir: str, force: bool, packed: bool, strip_rows: int):
+    tasks, skipped = [], 0
+    for fn in sorted(os.listdir(input_dir)):
+        if not fn.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        path = os.path.join(input_dir, fn).replace("\\", "/")
+        outputs = plane_paths(output_dir, fn, packed)
+        if not force and is_up_to_date(path, outputs):
+            skipped += 1
+            continue
+        tasks.append((path, outputs, packed, strip_rows))
+    return tasks, skipped
+
+def run_export(input_dir: str, output_dir: str, workers: int, force: bool = False,
+               packed: bool = False, strip_rows: int = 0) -> int:
+    packed = packed or strip_rows > 0
+    os.makedirs(output_dir, exist_ok=True)
+    tasks, skipped = collect_tasks(input_dir, output_dir, force, packed, strip_rows)
+    print(f"Найдено изображений: {len(tasks) + skipped}, актуальных: {skipped}, к обработке: {len(tasks)}")
+    if not tasks:
+        return 0
+    failed = 0
+    start = time.perf_counter()
+    # пока одни процессы декодируют следующие файлы, другие кодируют и пишут плоскости
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(export_image, task) for task in tasks]
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            path, success = future.result()
+            if not success:
+                failed += 1
+                print(f"Ошибка: {path}", file=sys.stderr)
+            elapsed = time.perf_counter() - start
+            print(f"[{done}/{len(tasks)}] {path} ({done / elapsed:.2f} изобр./с)")
+    elapsed = time.perf_counter() - start
+    print(f"Готово за {elapsed:.2f} с, {len(tasks) / elapsed:.2f} изобр./с, ошибок: {failed}")
+    return failed
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сохранение всех битовых плоскостей для изображений из папки")
+    parser.add_argument("input_dir", help="папка с исходными изображениями")
+    parser.add_argument("output_dir", help="папка для битовых плоскостей")
+    parser.add_argument("-j", "--workers", type=int, default=cpu_count(), help="число процессов")
+    parser.add_argument("-f", "--force", action="store_true", help="пересчитать даже актуальные файлы")
+    parser.add_argument("-p", "--packed", action="store_true",
+                        help="писать все плоскости одним упакованным файлом {имя}_bits.bpl вместо восьми BMP")
+    parser.add_argument("-s", "--stream", type=int, default=0, metavar="ROWS",
+                        help="писать плоскости полосами по ROWS строк (только упакованный вывод; "
+                             "PGM читается с диска по полосам, остальные форматы декодируются целиком)")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"нет такой папки: {args.input_dir}")
+    failed = run_export(args.input_dir, args.output_dir, max(1, args.workers), args.force,
+                        args.packed, max(0, args.stream))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
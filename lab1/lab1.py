@@ -1,24 +1,47 @@
 import sys, os
+import threading
+from collections import OrderedDict
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QFileDialog, QMessageBox, QRadioButton,
     QGroupBox, QSplitter
 )
-from PyQt6.QtGui import QPixmap, QImage, QColor
-from PyQt6.QtCore import Qt
-
-def create_bit_image(image, bit):
-    if image.isNull():
-        return QImage()
-    width, height = image.width(), image.height()
-    result = QImage(width, height, QImage.Format.Format_Grayscale8)
-    for y in range(height):
-        for x in range(width):
-            color = QColor(image.pixel(x, y))
-            gray_val = color.red()
-            extracted_bit = (gray_val >> bit) & 1
-            result.setPixel(x, y, 0xffffff if extracted_bit else 0)
-    return result
+from PyQt6.QtGui import QPixmap, QImage
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QSize, pyqtSignal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.bitplanes import bit_plane_images
+
+# сколько отрисовок (8 плоскостей + превью) держать: ключ - файл, его mtime и размер превью
+RENDER_CACHE_SIZE = 4
+
+class PlaneRenderSignals(QObject):
+    finished = pyqtSignal(int, object, list)
+
+class PlaneRenderTask(QRunnable):
+    def __init__(self, generation: int, key: tuple, image: QImage, size: QSize, cancel: threading.Event):
+        super().__init__()
+        self.generation = generation
+        self.key = key
+        self.image = image
+        self.size = size
+        self.cancel = cancel
+        self.signals = PlaneRenderSignals()
+
+    def run(self):
+        if self.cancel.is_set():
+            return
+        rendered = []
+        for plane in bit_plane_images(self.image):
+            if self.cancel.is_set():
+                return
+            scaled = plane.scaled(
+                self.size,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            )
+            rendered.append((plane, scaled))
+        self.signals.finished.emit(self.generation, self.key, rendered)
 
 class BitImageVisualizer(QMainWindow):
     def __init__(self):
@@ -27,8 +50,14 @@ class BitImageVisualizer(QMainWindow):
         self.resize(1000, 500)
         self.selected_bit = 0
         self.image_path = None
+        self.image_mtime = None
         self.original_image = QImage()
         self.processed_image = QImage()
+        self.render_cache = OrderedDict()
+        self.thread_pool = QThreadPool.globalInstance()
+        self.render_generation = 0
+        self.render_cancel = threading.Event()
+        self.render_signals = None
         central_area = QWidget()
         self.setCentralWidget(central_area)
         main_layout = QHBoxLayout(central_area)
@@ -94,6 +123,12 @@ class BitImageVisualizer(QMainWindow):
             if rb.isChecked():
                 self.selected_bit = i
                 break
+        if self.render_key() in self.render_cache:
+            self.display_plane(self.selected_bit)
+
+    def render_key(self) -> tuple:
+        size = self.lbl_processed.size()
+        return self.image_path, self.image_mtime, size.width(), size.height()
 
     def select_image(self):
         file_path, _ = QFileDialog.getOpenFileName(
@@ -103,11 +138,13 @@ class BitImageVisualizer(QMainWindow):
             "Изображения (*.png *.jpg *.jpeg *.bmp *.pgm);;Все файлы (*)"
         )
         if file_path:
+            self.cancel_render()
             self.image_path = file_path
             self.lbl_file.setText(file_path)
             if not self.original_image.load(file_path):
                 QMessageBox.warning(self, "Ошибка", "Не удалось открыть!")
                 return
+            self.image_mtime = os.path.getmtime(file_path)
             if self.original_image.format() != QImage.Format.Format_Grayscale8:
                 self.original_image = self.original_image.convertToFormat(QImage.Format.Format_Grayscale8)
             pixmap = QPixmap.fromImage(self.original_image).scaled(
@@ -121,12 +158,52 @@ class BitImageVisualizer(QMainWindow):
         if self.original_image.isNull():
             QMessageBox.warning(self, "Ошибка", "Сначала выберите картинку!")
             return
-        self.processed_image = create_bit_image(self.original_image, self.selected_bit)
-        pixmap = QPixmap.fromImage(self.processed_image).scaled(
+        if self.render_key() in self.render_cache:
+            self.display_plane(self.selected_bit)
+            return
+        self.lbl_processed.setText("Вычисление...")
+        self.start_render()
+
+    def start_render(self):
+        if self.render_signals is not None:
+            return
+        task = PlaneRenderTask(
+            self.render_generation,
+            self.render_key(),
+            QImage(self.original_image),
             self.lbl_processed.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
+            self.render_cancel
         )
+        task.signals.finished.connect(self.on_planes_rendered)
+        self.render_signals = task.signals
+        self.thread_pool.start(task)
+
+    def cancel_render(self):
+        self.render_cancel.set()
+        self.render_cancel = threading.Event()
+        self.render_generation += 1
+        self.render_signals = None
+        self.processed_image = QImage()
+        self.lbl_processed.clear()
+        self.lbl_processed.setText("Нет картинки")
+
+    def on_planes_rendered(self, generation, key, rendered):
+        # готовая отрисовка кэшируется, даже если пользователь уже выбрал другой файл
+        self.render_cache[key] = [(plane, QPixmap.fromImage(scaled)) for plane, scaled in rendered]
+        self.render_cache.move_to_end(key)
+        while len(self.render_cache) > RENDER_CACHE_SIZE:
+            self.render_cache.popitem(last=False)
+        if generation != self.render_generation:
+            return
+        self.render_signals = None
+        if key == self.render_key():
+            self.display_plane(self.selected_bit)
+
+    def display_plane(self, bit):
+        key = self.render_key()
+        self.render_cache.move_to_end(key)
+        plane, pixmap = self.render_cache[key][bit]
+        self.processed_image = plane
         self.lbl_processed.setPixmap(pixmap)
 
     def save_one_bit(self):
@@ -154,9 +231,12 @@ class BitImageVisualizer(QMainWindow):
             return
         success = True
         base_name = os.path.splitext(os.path.basename(self.image_path))[0]
-        save_path = ""  
-        for b in range(8):
-            bit_image = create_bit_image(self.original_image, b)
+        save_path = ""
+        if self.render_key() in self.render_cache:
+            bit_images = [plane for plane, _ in self.render_cache[self.render_key()]]
+        else:
+            bit_images = bit_plane_images(self.original_image)
+        for b, bit_image in enumerate(bit_images):
             save_name = f"{base_name}_bit_{b}.bmp"
             path_tmp = os.path.join(folder, save_name)
             path_tmp = path_tmp.replace("\\", "/")
@@ -0,0 +1,53 @@
+import numpy as np
+from functools import lru_cache
+
+FEISTEL_ROUNDS = 6
+
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+class KeyedPermutation:
+    # псевдослучайная перестановка [0, n) на сети Фейстеля с "cycle walking":
+    # i-я позиция вычисляется независимо, поэтому первые k индексов стоят O(k)
+    def __init__(self, n: int, seed: int):
+        self.n = n
+        self.half_bits = max(1, ((max(n, 2) - 1).bit_length() + 1) // 2)
+        self.half_mask = np.uint64((1 << self.half_bits) - 1)
+        self.shift = np.uint64(self.half_bits)
+        rng = np.random.default_rng(seed)
+        self.keys = rng.integers(0, 2 ** 64, FEISTEL_ROUNDS, dtype=np.uint64, endpoint=False)
+
+    def _round(self, right: np.ndarray, key: np.uint64) -> np.ndarray:
+        x = right ^ key
+        x = (x ^ (x >> np.uint64(30))) * _MIX1
+        x = (x ^ (x >> np.uint64(27))) * _MIX2
+        x ^= x >> np.uint64(31)
+        return x & self.half_mask
+
+    def _encrypt(self, values: np.ndarray) -> np.ndarray:
+        left = values >> self.shift
+        right = values & self.half_mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self.shift) | right
+
+    def permute(self, positions: np.ndarray) -> np.ndarray:
+        out = self._encrypt(np.asarray(positions, dtype=np.uint64))
+        pending = np.flatnonzero(out >= self.n)
+        while pending.size:
+            out[pending] = self._encrypt(out[pending])
+            pending = pending[out[pending] >= self.n]
+        return out.astype(np.int64)
+
+    def take(self, k: int) -> np.ndarray:
+        return self.permute(np.arange(min(k, self.n), dtype=np.uint64))
+
+    def iter_chunks(self, chunk_size: int = 4096, start: int = 0):
+        for begin in range(start, self.n, chunk_size):
+            end = min(begin + chunk_size, self.n)
+            yield self.permute(np.arange(begin, end, dtype=np.uint64))
+
+# кэшируются только ключи раундов: объект не растёт с n
+@lru_cache(maxsize=16)
+def keyed_permutation(n: int, seed: int) -> KeyedPermutation:
+    return KeyedPermutation(n, seed)
@@ -1,6 +1,5 @@
 import sys, os
 import numpy as np
-import difflib
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QFileDialog, QMessageBox, QTabWidget,
@@ -9,129 +8,72 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import QPixmap, QImage
 from PyQt6.QtCore import Qt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.qt_arrays import rgb_view, array_to_qimage
+from common.bitstream import decode_until_marker
+from common.bitbuffer import BitBuffer
+from common.metrics import compare_images
+from common.scoring import score_message, format_score
+from keyed_permutation import keyed_permutation
+
 END_MARKER = b"\xfe\x00\xff\xfa"
 
-def text_to_bits_with_marker(text: str) -> list[int]:
-    data = text.encode('utf-8', errors='replace')
-    data_marker = data + END_MARKER
-    bits = []
-    for byte in data_marker:
-        for i in range(8):
-            bit = (byte >> (7 - i)) & 1
-            bits.append(bit)
-    return bits
-
-def bits_to_text_with_marker(bits: list[int]) -> str:
-    if not bits:
+def text_to_bits_with_marker(text: str) -> BitBuffer:
+    return BitBuffer.from_text(text, END_MARKER)
+
+def bits_to_text_with_marker(bits) -> str:
+    bits = BitBuffer(bits)
+    if not len(bits):
         return ""
-    r = len(bits) % 8
-    if r != 0:
-        bits += [0] * (8 - r)
-    raw_bytes = bytearray()
-    for i in range(0, len(bits), 8):
-        val = 0
-        for b in bits[i:i+8]:
-            val = (val << 1) | b
-        raw_bytes.append(val)
-    idx_marker = raw_bytes.find(END_MARKER)
-    if idx_marker < 0:
-        payload = raw_bytes
-    else:
-        payload = raw_bytes[:idx_marker]
-    text = payload.decode('utf-8', errors='replace')
-    return text
+    idx_marker = bits.find_marker(END_MARKER)
+    payload = bits if idx_marker < 0 else bits[:idx_marker]
+    return payload.to_bytes().decode('utf-8', errors='replace')
 
 def brightness(r, g, b):
     return 0.299 * r + 0.587 * g + 0.114 * b
 
-def embed_kjb(cover: QImage, bits: list[int], lam: float, seed: int):
+def embed_kjb(cover: QImage, bits: BitBuffer, lam: float, seed: int):
     if cover.isNull():
         return QImage(), []
     width, height = cover.width(), cover.height()
     total_pixels = width * height
     if len(bits) > total_pixels:
         return QImage(), []
-    cover = cover.convertToFormat(QImage.Format.Format_RGB888)
-    result = QImage(cover)
-    rng = np.random.default_rng(seed)
-    all_indices = np.arange(total_pixels)
-    rng.shuffle(all_indices)
-    used_indices = all_indices[:len(bits)]
-    for i, bit_val in enumerate(bits):
-        linear_index = used_indices[i]
-        y = linear_index // width
-        x = linear_index % width
-        color = result.pixelColor(x, y)
-        R, G, B_val = color.red(), color.green(), color.blue()
-        Y = brightness(R, G, B_val)
-        if bit_val == 1:
-            B_new = B_val + lam * Y
-        else:
-            B_new = B_val - lam * Y
-        B_new = max(0, min(255, B_new))
-        color.setBlue(int(B_new))
-        result.setPixelColor(x, y, color)
-    return result, used_indices
-
-def extract_kjb(image: QImage, lam: float, seed: int) -> list[int]:
+    rgb = rgb_view(cover).copy()
+    pixels = rgb.reshape(-1, 3)
+    used_indices = keyed_permutation(total_pixels, seed).take(len(bits))
+    selected = pixels[used_indices].astype(np.float64)
+    B_val = selected[:, 2]
+    Y = brightness(selected[:, 0], selected[:, 1], B_val)
+    B_new = np.where(np.asarray(bits, dtype=bool), B_val + lam * Y, B_val - lam * Y)
+    pixels[used_indices, 2] = np.clip(B_new, 0, 255).astype(np.uint8)
+    return array_to_qimage(rgb), used_indices
+
+def kjb_bits_at(blue: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    # бит пикселя: синий >= среднего синего по крестовой окрестности
+    height, width = blue.shape
+    y, x = np.divmod(indices, width)
+    B_val = blue[y, x].astype(np.int32)
+    sums = np.zeros_like(B_val)
+    counts = np.zeros_like(B_val)
+    for dy, dx, valid in ((0, -1, x > 0), (0, 1, x < width - 1), (-1, 0, y > 0), (1, 0, y < height - 1)):
+        sums[valid] += blue[y[valid] + dy, x[valid] + dx]
+        counts += valid
+    # B >= sum / n  <=>  B * n >= sum; при n == 0 оценка равна самому B
+    return (B_val * counts >= sums).astype(np.uint8)
+
+def iter_kjb_bits(image: QImage, seed: int, chunk_size: int = 4096):
     if image.isNull():
-        return []
-    width, height = image.width(), image.height()
-    total_pixels = width * height
-    image = image.convertToFormat(QImage.Format.Format_RGB888)
-    rng = np.random.default_rng(seed)
-    all_indices = np.arange(total_pixels)
-    rng.shuffle(all_indices)
-    bits = []
-    for i in range(total_pixels):
-        linear_index = all_indices[i]
-        y = linear_index // width
-        x = linear_index % width
-        color = image.pixelColor(x, y)
-        B_val = color.blue()
-        neighbors = []
-        if x > 0:
-            neighbors.append(image.pixelColor(x - 1, y).blue())
-        if x < width - 1:
-            neighbors.append(image.pixelColor(x + 1, y).blue())
-        if y > 0:
-            neighbors.append(image.pixelColor(x, y - 1).blue())
-        if y < height - 1:
-            neighbors.append(image.pixelColor(x, y + 1).blue())
-        b_est = sum(neighbors) / len(neighbors) if neighbors else B_val
-        bit = 1 if B_val >= b_est else 0
-        bits.append(bit)
-    return bits
-
-def measure_blue_diff(original: QImage, watermarked: QImage) -> float:
-    if original.isNull() or watermarked.isNull():
-        return 0.0
-    width, height = original.width(), original.height()
-    if width != watermarked.width() or height != watermarked.height():
-        return 0.0
-    orig = original.convertToFormat(QImage.Format.Format_RGB888)
-    watermarked = watermarked.convertToFormat(QImage.Format.Format_RGB888)
-    total_pixels = width * height
-    diff_sum = 0
-    for y in range(height):
-        for x in range(width):
-            diff_sum += abs(orig.pixelColor(x, y).blue() - watermarked.pixelColor(x, y).blue())
-    return diff_sum / total_pixels
-
-def measure_changed_only(original: QImage, watermarked: QImage, used_indices: np.ndarray) -> float:
-    if original.isNull() or watermarked.isNull() or used_indices.size == 0:
-        return 0.0
-    width, height = original.width(), original.height()
-    if width != watermarked.width() or height != watermarked.height():
-        return 0.0
-    orig = original.convertToFormat(QImage.Format.Format_RGB888)
-    watermarked = watermarked.convertToFormat(QImage.Format.Format_RGB888)
-    diff_sum = 0
-    for linear_index in used_indices:
-        y = linear_index // width
-        x = linear_index % width
-        diff_sum += abs(orig.pixelColor(x, y).blue() - watermarked.pixelColor(x, y).blue())
-    return diff_sum / used_indices.size
+        return
+    blue = rgb_view(image)[:, :, 2]
+    for indices in keyed_permutation(blue.size, seed).iter_chunks(chunk_size):
+        yield kjb_bits_at(blue, indices)
+
+def extract_kjb_payload(image: QImage, seed: int) -> bytes:
+    return decode_until_marker(iter_kjb_bits(image, seed), END_MARKER)
+
+def extract_kjb_text(image: QImage, seed: int) -> str:
+    return extract_kjb_payload(image, seed).decode('utf-8', errors='replace')
 
 class KJBVisualizer(QMainWindow):
     def __init__(self):
@@ -143,6 +85,7 @@ class KJBVisualizer(QMainWindow):
         self.used_indices = np.array([], dtype=np.int64)
         self.last_embedded_text = ""
         self.last_saved_filepath = ""
+        self.last_extracted_payload = b""
         self.init_ui()
 
     def init_ui(self):
@@ -327,10 +270,12 @@ class KJBVisualizer(QMainWindow):
             Qt.TransformationMode.SmoothTransformation
         )
         self.lbl_processed_display.setPixmap(pix_processed)
-        diff_all = measure_blue_diff(self.original_image, self.processed_image)
-        diff_changed = measure_changed_only(self.original_image, self.processed_image, used_idx)
-        perc_all = (diff_all / 255) * 100
-        perc_changed = (diff_changed / 255) * 100
+        metrics = compare_images(self.original_image, self.processed_image, "blue", used_idx)
+        if metrics is None:
+            QMessageBox.warning(self, "Ошибка", "Размеры изображений не совпадают!")
+            return
+        perc_all = (metrics.mae / 255) * 100
+        perc_changed = (metrics.changed_mae / 255) * 100
         self.lbl_diff_all.setText(f"Изменение по всем пикселям: {perc_all:.4f}%")
         self.lbl_diff_changed.setText(f"Изменение только в изменённых: {perc_changed:.4f}%")
         QMessageBox.information(self, "OK", "Сообщение встроено.")
@@ -365,6 +310,7 @@ class KJBVisualizer(QMainWindow):
                 QMessageBox.warning(self, "Ошибка", "Не удалось загрузить!")
                 return
             self.processed_image = image
+            self.last_extracted_payload = b""
             self.lbl_embedded_path.setText(file_path)
             pixmap = QPixmap.fromImage(image).scaled(
                 self.lbl_embedded_display.size(),
@@ -381,8 +327,8 @@ class KJBVisualizer(QMainWindow):
             seed_value = int(self.seed_line_extract.text())
         except ValueError:
             seed_value = 12345
-        raw_bits = extract_kjb(self.processed_image, 0, seed_value)
-        extracted_text = bits_to_text_with_marker(raw_bits)
+        self.last_extracted_payload = extract_kjb_payload(self.processed_image, seed_value)
+        extracted_text = self.last_extracted_payload.decode('utf-8', errors='replace')
         self.txt_extracted.setPlainText(extracted_text)
         QMessageBox.information(self, "OK", "Сообщение извлечено.")
 
@@ -395,15 +341,11 @@ class KJBVisualizer(QMainWindow):
         if loaded_filename != last_saved_filename:
             QMessageBox.warning(self, "Ошибка", "Загруженный файл не совпадает с последним сохранённым!")
             return
-        original_text = self.last_embedded_text
-        extracted_text = self.txt_extracted.toPlainText()
-        if not original_text or not extracted_text:
+        score = score_message(self.last_embedded_text, self.last_extracted_payload)
+        if score is None:
             QMessageBox.warning(self, "Ошибка", "Отсутствует оригинальный или извлечённый текст!")
             return
-        sequence_matcher = difflib.SequenceMatcher(None, original_text, extracted_text)
-        ratio = sequence_matcher.ratio()
-        error_percent = (1 - ratio) * 100
-        QMessageBox.information(self, "Ошибка", f"Ошибка в извлечении: {error_percent:.2f}%")
+        QMessageBox.information(self, "Ошибка", format_score(score))
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -1,132 +1,195 @@
 import sys, os
-import difflib, math
+import concurrent.futures
+from multiprocessing import cpu_count
+from functools import lru_cache
+import numpy as np
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QFileDialog, QMessageBox, QTabWidget,
-    QPlainTextEdit, QGroupBox, QDialog, QDialogButtonBox
+    QPlainTextEdit, QGroupBox, QDialog, QDialogButtonBox, QProgressBar
 )
-from PyQt6.QtGui import QPixmap, QImage, QColor
-from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QPixmap, QImage
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.qt_arrays import gray_view, array_to_qimage
+from common.bitstream import decode_until_marker
+from common.bitbuffer import BitBuffer
+from common.metrics import compare_images
+from common.scoring import score_message, format_score
 
 END_MARKER = b"\xfe\x00\xff\xfa"
 
-def text_to_bits_with_marker(text: str) -> list[int]:
-    data = text.encode('utf-8', errors='replace')
-    data_marker = data + END_MARKER
-    bits = []
-    for byte in data_marker:
-        for i in range(8):
-            bit = (byte >> (7 - i)) & 1
-            bits.append(bit)
-    return bits
+def text_to_bits_with_marker(text: str) -> BitBuffer:
+    return BitBuffer.from_text(text, END_MARKER)
 
-def bits_to_text_with_marker(bits: list[int]) -> str:
-    if not bits:
+def bits_to_text_with_marker(bits) -> str:
+    bits = BitBuffer(bits)
+    if not len(bits):
         return ""
-    r = len(bits) % 8
-    if r != 0:
-        bits += [0] * (8 - r)
-    raw_bytes = bytearray()
-    for i in range(0, len(bits), 8):
-        val = 0
-        for b in bits[i:i+8]:
-            val = (val << 1) | b
-        raw_bytes.append(val)
-    idx_marker = raw_bytes.find(END_MARKER)
-    if idx_marker < 0:
-        payload = raw_bytes
-    else:
-        payload = raw_bytes[:idx_marker]
-    text = payload.decode('utf-8', errors='replace')
-    return text
+    idx_marker = bits.find_marker(END_MARKER)
+    payload = bits if idx_marker < 0 else bits[:idx_marker]
+    return payload.to_bytes().decode('utf-8', errors='replace')
 
 def f(yi, yi_plus):
     return ((yi // 2) + yi_plus) & 1
 
-def adjust_first_pixel(pixel, constant, target_m):
-    candidate_minus = pixel - 1 if pixel > 0 else None
-    candidate_plus  = pixel + 1 if pixel < 255 else None
-    if candidate_minus is not None and f(candidate_minus, constant) == target_m:
-        return candidate_minus
-    if candidate_plus is not None and f(candidate_plus, constant) == target_m:
-        return candidate_plus
-    return candidate_plus if candidate_plus is not None else candidate_minus if candidate_minus is not None else pixel
-
-def adjust_second_pixel(pixel, constant, target_m):
-    candidate_minus = pixel - 1 if pixel > 0 else None
-    candidate_plus  = pixel + 1 if pixel < 255 else None
-    if pixel % 2 == 0:
-        if candidate_plus is not None and f(constant, candidate_plus) == target_m:
-            return candidate_plus
-        if candidate_minus is not None and f(constant, candidate_minus) == target_m:
-            return candidate_minus
-    else:
-        if candidate_minus is not None and f(constant, candidate_minus) == target_m:
-            return candidate_minus
-        if candidate_plus is not None and f(constant, candidate_plus) == target_m:
-            return candidate_plus
-    return candidate_plus if candidate_plus is not None else candidate_minus if candidate_minus is not None else pixel
-
-def embed_lsb_matching_revisited(cover: QImage, bits: list[int]):
+@lru_cache(maxsize=1)
+def lsbmr_tables() -> tuple[np.ndarray, np.ndarray]:
+    # таблицы решений LSBMR: индекс ((p1 * 256 + p2) * 2 + m1) * 2 + m2 -> (new1, new2)
+    p1, p2, m1, m2 = np.meshgrid(np.arange(256), np.arange(256), (0, 1), (0, 1), indexing='ij')
+    minus1_ok = (p1 > 0) & (f(p1 - 1, p2) == m2)
+    plus1_ok = (p1 < 255) & (f(p1 + 1, p2) == m2)
+    fallback1 = np.where(p1 < 255, p1 + 1, p1 - 1)
+    adjusted1 = np.where(minus1_ok, p1 - 1, np.where(plus1_ok, p1 + 1, fallback1))
+    minus2_ok = (p2 > 0) & (f(p1, p2 - 1) == m2)
+    plus2_ok = (p2 < 255) & (f(p1, p2 + 1) == m2)
+    fallback2 = np.where(p2 < 255, p2 + 1, p2 - 1)
+    adjusted2 = np.where(
+        p2 % 2 == 0,
+        np.where(plus2_ok, p2 + 1, np.where(minus2_ok, p2 - 1, fallback2)),
+        np.where(minus2_ok, p2 - 1, np.where(plus2_ok, p2 + 1, fallback2))
+    )
+    first_mismatch = (p1 & 1) != m1
+    new1 = np.where(first_mismatch, adjusted1, p1)
+    new2 = np.where(first_mismatch | (f(p1, p2) == m2), p2, adjusted2)
+    return new1.astype(np.uint8).ravel(), new2.astype(np.uint8).ravel()
+
+def embed_lsb_matching_revisited(cover: QImage, bits: BitBuffer):
     if cover.isNull():
         return QImage(), []
-    cover_gray = cover.convertToFormat(QImage.Format.Format_Grayscale8)
-    width, height = cover_gray.width(), cover_gray.height()
+    bits = np.asarray(BitBuffer(bits), dtype=np.intp)
+    gray = gray_view(cover)
+    height, width = gray.shape
     total_pixels = width * height
     if total_pixels % 2 == 1:
         total_pixels -= 1
     total_pairs = total_pixels // 2
     if len(bits) > total_pairs * 2:
         return QImage(), []
-    result = QImage(cover_gray)
-    bit_index = 0
-    for i in range(total_pairs):
-        if bit_index >= len(bits):
-            break
-        idx1 = 2 * i
-        idx2 = 2 * i + 1
-        y1, x1 = idx1 // width, idx1 % width
-        y2, x2 = idx2 // width, idx2 % width
-        pixel1 = result.pixelColor(x1, y1).red()
-        pixel2 = result.pixelColor(x2, y2).red()
-        m1 = bits[bit_index]
-        bit_index += 1
-        m2 = bits[bit_index] if bit_index < len(bits) else 0
-        bit_index += 1
-        if (pixel1 & 1) != m1:
-            new_pixel1 = adjust_first_pixel(pixel1, pixel2, m2)
-            new_pixel2 = pixel2
-        else:
-            new_pixel1 = pixel1
-            if f(new_pixel1, pixel2) == m2:
-                new_pixel2 = pixel2
-            else:
-                new_pixel2 = adjust_second_pixel(pixel2, new_pixel1, m2)  
-        result.setPixelColor(x1, y1, QColor(new_pixel1, new_pixel1, new_pixel1))
-        result.setPixelColor(x2, y2, QColor(new_pixel2, new_pixel2, new_pixel2))
-    used_indices = list(range(total_pixels))
-    return result, used_indices
-
-def extract_lsb_matching_revisited(stego: QImage):
+    result = gray.copy()
+    pixels = result.reshape(-1)
+    used_pairs = (len(bits) + 1) // 2
+    messages = np.zeros(used_pairs * 2, dtype=np.intp)
+    messages[:len(bits)] = bits
+    pixel1 = pixels[0:2 * used_pairs:2]
+    pixel2 = pixels[1:2 * used_pairs:2]
+    index = ((pixel1.astype(np.intp) * 256 + pixel2) * 2 + messages[0::2]) * 2 + messages[1::2]
+    new1, new2 = lsbmr_tables()
+    pixel1[:] = new1[index]
+    pixel2[:] = new2[index]
+    return array_to_qimage(result), range(total_pixels)
+
+def embed_rate_sweep(cover: QImage, bits, counts: list[int]) -> list[QImage]:
+    # пары независимы: стего для первых n бит = полное стего на первых парах + исходник дальше
+    if cover.isNull():
+        return [QImage() for _ in counts]
+    bits = BitBuffer(bits)
+    capacity_bits, _ = compute_capacity(cover)
+    valid = [n for n in counts if n <= min(capacity_bits, len(bits))]
+    if not valid:
+        return [QImage() for _ in counts]
+    max_count = max(valid)
+    full_stego, _ = embed_lsb_matching_revisited(cover, bits[:max_count])
+    gray = gray_view(cover)
+    cover_pixels = np.ascontiguousarray(gray).reshape(-1)
+    stego_pixels = gray_view(full_stego).reshape(-1)
+    new1, new2 = lsbmr_tables()
+    results = []
+    for n in counts:
+        if n not in valid:
+            results.append(QImage())
+            continue
+        full_pairs = n // 2
+        pixels = cover_pixels.copy()
+        pixels[:2 * full_pairs] = stego_pixels[:2 * full_pairs]
+        if n % 2:
+            # последняя пара при нечетном n дополняется нулевым битом
+            p1, p2 = int(cover_pixels[2 * full_pairs]), int(cover_pixels[2 * full_pairs + 1])
+            index = ((p1 * 256 + p2) * 2 + bits[n - 1]) * 2
+            pixels[2 * full_pairs] = new1[index]
+            pixels[2 * full_pairs + 1] = new2[index]
+        results.append(array_to_qimage(pixels.reshape(gray.shape)))
+    return results
+
+def batch_embed_file(task):
+    path, output_dir, percents = task
+    img = QImage(path)
+    if img.isNull():
+        return path, 0
+    cap_bits, _ = compute_capacity(img)
+    base, ext = os.path.splitext(os.path.basename(path))
+    fmt = ext.lstrip('.').upper()
+    counts = [cap_bits * p // 100 for p in percents]
+    saved = 0
+    for p, stego in zip(percents, embed_rate_sweep(img, BitBuffer.zeros(max(counts)), counts)):
+        out = os.path.join(output_dir, f"{base}_lab3_stego_{p}.{fmt}")
+        if stego.save(out, fmt):
+            saved += 1
+    return path, saved
+
+class BatchEmbedSignals(QObject):
+    progress = pyqtSignal(int, int, str, int)
+    finished = pyqtSignal()
+
+class BatchEmbedTask(QRunnable):
+    # пул процессов обслуживается из потока QThreadPool, GUI получает прогресс сигналами
+    def __init__(self, tasks: list):
+        super().__init__()
+        self.tasks = tasks
+        self.signals = BatchEmbedSignals()
+
+    def run(self):
+        total = len(self.tasks)
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=cpu_count()) as executor:
+                futures = [executor.submit(batch_embed_file, task) for task in self.tasks]
+                for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    path, saved = future.result()
+                    self.signals.progress.emit(done, total, path, saved)
+        finally:
+            self.signals.finished.emit()
+
+def pair_bits(gray: np.ndarray, start_pair: int, end_pair: int) -> np.ndarray:
+    # биты пар [start_pair, end_pair): p1 & 1 и f(p1, p2), копируются только нужные строки
+    width = gray.shape[1]
+    first_row = (2 * start_pair) // width
+    last_row = (2 * end_pair + width - 1) // width
+    offset = 2 * start_pair - first_row * width
+    pixels = gray[first_row:last_row].reshape(-1)[offset:offset + 2 * (end_pair - start_pair)]
+    pixel1 = pixels[0::2]
+    pixel2 = pixels[1::2]
+    bits = np.empty(pixels.size, dtype=np.uint8)
+    bits[0::2] = pixel1 & 1
+    bits[1::2] = f(pixel1, pixel2)
+    return bits
+
+def extract_lsb_matching_revisited(stego: QImage, max_pairs: int = None) -> BitBuffer:
     if stego.isNull():
-        return []
-    stego_gray = stego.convertToFormat(QImage.Format.Format_Grayscale8)
-    width, height = stego_gray.width(), stego_gray.height()
-    total_pixels = width * height
-    if total_pixels % 2 == 1:
-        total_pixels -= 1
-    total_pairs = total_pixels // 2
-    extracted_bits = []
-    for i in range(total_pairs):
-        idx1 = 2 * i
-        idx2 = 2 * i + 1
-        y1, x1 = idx1 // width, idx1 % width
-        y2, x2 = idx2 // width, idx2 % width
-        pixel1 = stego_gray.pixelColor(x1, y1).red()
-        pixel2 = stego_gray.pixelColor(x2, y2).red()
-        extracted_bits.append(pixel1 & 1)
-        extracted_bits.append(f(pixel1, pixel2))
-    return extracted_bits
+        return BitBuffer()
+    gray = gray_view(stego)
+    total_pairs = gray.size // 2
+    if max_pairs is not None:
+        total_pairs = min(total_pairs, max_pairs)
+    return BitBuffer(pair_bits(gray, 0, total_pairs))
+
+def iter_lsb_matching_revisited_bits(stego: QImage, chunk_pairs: int = 4096, max_chunk_pairs: int = 1 << 20):
+    if stego.isNull():
+        return
+    gray = gray_view(stego)
+    total_pairs = gray.size // 2
+    start = 0
+    while start < total_pairs:
+        end = min(start + chunk_pairs, total_pairs)
+        yield pair_bits(gray, start, end)
+        start = end
+        chunk_pairs = min(chunk_pairs * 2, max_chunk_pairs)
+
+def extract_lsb_matching_revisited_payload(stego: QImage) -> bytes:
+    return decode_until_marker(iter_lsb_matching_revisited_bits(stego), END_MARKER)
+
+def extract_lsb_matching_revisited_text(stego: QImage) -> str:
+    return extract_lsb_matching_revisited_payload(stego).decode('utf-8', errors='replace')
 
 def compute_capacity(cover: QImage):
     width, height = cover.width(), cover.height()
@@ -137,33 +200,6 @@ def compute_capacity(cover: QImage):
     capacity_bytes = capacity_bits // 8
     return capacity_bits, capacity_bytes
 
-def compute_psnr(cover: QImage, stego: QImage):
-    cover_gray = cover.convertToFormat(QImage.Format.Format_Grayscale8)
-    stego_gray = stego.convertToFormat(QImage.Format.Format_Grayscale8)
-    width, height = cover_gray.width(), cover_gray.height()
-    mse = 0
-    count = width * height
-    for y in range(height):
-        for x in range(width):
-            diff = cover_gray.pixelColor(x, y).red() - stego_gray.pixelColor(x, y).red()
-            mse += diff * diff
-    mse /= count
-    if mse == 0:
-        return float('inf')
-    psnr = 10 * math.log10((255 ** 2) / mse)
-    return psnr
-
-def create_diff_image(cover: QImage, stego: QImage):
-    cover_gray = cover.convertToFormat(QImage.Format.Format_Grayscale8)
-    stego_gray = stego.convertToFormat(QImage.Format.Format_Grayscale8)
-    width, height = cover_gray.width(), cover_gray.height()
-    diff_img = QImage(width, height, QImage.Format.Format_Grayscale8)
-    for y in range(height):
-        for x in range(width):
-            diff = abs(cover_gray.pixelColor(x, y).red() - stego_gray.pixelColor(x, y).red())
-            diff_img.setPixelColor(x, y, QColor(diff, diff, diff))
-    return diff_img
-
 class LSBMR(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -174,6 +210,8 @@ class LSBMR(QMainWindow):
         self.used_indices = []
         self.last_embedded_text = ""
         self.last_saved_filepath = ""
+        self.last_extracted_payload = b""
+        self.batch_signals = None
         self.init_ui()
 
     def init_ui(self):
@@ -309,9 +347,13 @@ class LSBMR(QMainWindow):
         self.txt_percents = QPlainTextEdit()
         self.txt_percents.setPlaceholderText("10,50,100")
         layout.addWidget(self.txt_percents)
-        btn_run = QPushButton("Старт")
-        btn_run.clicked.connect(self.run_batch_embedding)
-        layout.addWidget(btn_run)
+        self.btn_batch_run = QPushButton("Старт")
+        self.btn_batch_run.clicked.connect(self.run_batch_embedding)
+        layout.addWidget(self.btn_batch_run)
+        self.batch_progress = QProgressBar()
+        layout.addWidget(self.batch_progress)
+        self.lbl_batch_status = QLabel("")
+        layout.addWidget(self.lbl_batch_status)
 
     def select_cover_image(self):
         file_path, _ = QFileDialog.getOpenFileName(
@@ -362,16 +404,11 @@ class LSBMR(QMainWindow):
             Qt.TransformationMode.SmoothTransformation
         )
         self.lbl_processed_display.setPixmap(pix_processed)
-        cover_gray = self.original_image.convertToFormat(QImage.Format.Format_Grayscale8)
-        stego_gray = self.processed_image.convertToFormat(QImage.Format.Format_Grayscale8)
-        width, height = cover_gray.width(), cover_gray.height()
-        diff_sum = 0
-        count = width * height
-        for y in range(height):
-            for x in range(width):
-                diff_sum += abs(cover_gray.pixelColor(x, y).red() - stego_gray.pixelColor(x, y).red())
-        avg_diff = diff_sum / count if count else 0
-        perc_all = (avg_diff / 255) * 100
+        metrics = compare_images(self.original_image, self.processed_image)
+        if metrics is None:
+            QMessageBox.warning(self, "Ошибка", "Размеры изображений не совпадают!")
+            return
+        perc_all = (metrics.mae / 255) * 100
         self.lbl_diff_all.setText(f"Изменение по всем пикселям: {perc_all:.4f}%")
         bits_count = len(bits)
         bytes_count = bits_count // 8
@@ -410,6 +447,7 @@ class LSBMR(QMainWindow):
                 QMessageBox.warning(self, "Ошибка", "Не удалось загрузить!")
                 return
             self.processed_image = image
+            self.last_extracted_payload = b""
             self.lbl_embedded_path.setText(file_path)
             pixmap = QPixmap.fromImage(image).scaled(
                 self.lbl_embedded_display.size(),
@@ -422,8 +460,8 @@ class LSBMR(QMainWindow):
         if self.processed_image.isNull():
             QMessageBox.warning(self, "Ошибка", "Нет изображения для извлечения!")
             return
-        raw_bits = extract_lsb_matching_revisited(self.processed_image)
-        extracted_text = bits_to_text_with_marker(raw_bits)
+        self.last_extracted_payload = extract_lsb_matching_revisited_payload(self.processed_image)
+        extracted_text = self.last_extracted_payload.decode('utf-8', errors='replace')
         self.txt_extracted.setPlainText(extracted_text)
         QMessageBox.information(self, "OK", "Сообщение извлечено.")
 
@@ -436,23 +474,23 @@ class LSBMR(QMainWindow):
         if loaded_filename != last_saved_filename:
             QMessageBox.warning(self, "Ошибка", "Загруженный файл не совпадает с последним сохранённым!")
             return
-        original_text = self.last_embedded_text
-        extracted_text = self.txt_extracted.toPlainText()
-        if not original_text or not extracted_text:
+        score = score_message(self.last_embedded_text, self.last_extracted_payload)
+        if score is None:
             QMessageBox.warning(self, "Ошибка", "Отсутствует оригинальный или извлечённый текст!")
             return
-        sequence_matcher = difflib.SequenceMatcher(None, original_text, extracted_text)
-        ratio = sequence_matcher.ratio()
-        error_percent = (1 - ratio) * 100
-        QMessageBox.information(self, "Результат", f"Ошибка в извлечении: {error_percent:.2f}%")
+        QMessageBox.information(self, "Результат", format_score(score))
 
     def visual_analysis(self):
         if self.original_image.isNull() or self.processed_image.isNull():
             QMessageBox.warning(self, "Ошибка", "Необходимо загрузить оригинальное и стего-изображение!")
             return
         cap_bits, cap_bytes = compute_capacity(self.original_image)
-        psnr_val = compute_psnr(self.original_image, self.processed_image)
-        diff_img = create_diff_image(self.original_image, self.processed_image)
+        metrics = compare_images(self.original_image, self.processed_image)
+        if metrics is None:
+            QMessageBox.warning(self, "Ошибка", "Размеры изображений не совпадают!")
+            return
+        psnr_val = metrics.psnr
+        diff_img = metrics.diff_image()
 
         dialog = QDialog(self)
         dialog.setWindowTitle("Визуальный анализ стегоконтейнера")
@@ -522,20 +560,27 @@ class LSBMR(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Укажите все параметры")
             return
         percents = [int(p) for p in self.txt_percents.toPlainText().split(',') if p.strip().isdigit()]
+        if not percents:
+            QMessageBox.warning(self, "Ошибка", "Укажите все параметры")
+            return
         os.makedirs(self.output_dir, exist_ok=True)
-        for fn in os.listdir(self.input_dir):
-            path = os.path.join(self.input_dir, fn)
-            img = QImage(path)
-            if img.isNull(): continue
-            cap_bits, _ = compute_capacity(img)
-            base, ext = os.path.splitext(fn)
-            fmt = ext.lstrip('.').upper()
-            for p in percents:
-                n = cap_bits * p // 100
-                bits = [0] * n
-                stego, _ = embed_lsb_matching_revisited(img, bits)
-                out = os.path.join(self.output_dir, f"{base}_lab3_stego_{p}.{fmt}")
-                stego.save(out, fmt)
+        tasks = [(os.path.join(self.input_dir, fn), self.output_dir, percents) for fn in os.listdir(self.input_dir)]
+        self.batch_progress.setRange(0, len(tasks))
+        self.batch_progress.setValue(0)
+        self.btn_batch_run.setEnabled(False)
+        task = BatchEmbedTask(tasks)
+        task.signals.progress.connect(self.on_batch_progress)
+        task.signals.finished.connect(self.on_batch_finished)
+        self.batch_signals = task.signals
+        QThreadPool.globalInstance().start(task)
+
+    def on_batch_progress(self, done, total, path, saved):
+        self.batch_progress.setValue(done)
+        self.lbl_batch_status.setText(f"{done}/{total}: {os.path.basename(path)} ({saved} файлов)")
+
+    def on_batch_finished(self):
+        self.batch_signals = None
+        self.btn_batch_run.setEnabled(True)
         QMessageBox.information(self, "OK", "Генерация завершена")
 
 
@@ -0,0 +1,92 @@
+import sys, os
+import argparse
+import json
+import hashlib
+
+CAPACITY_INDEX_NAME = "imnp_capacity.json"
+CAPACITY_INDEX_VERSION = 1
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".pgm")
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class CapacityIndex:
+    # ёмкость IMNP по хэшу содержимого файла; файл индекса переписывается целиком при save()
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CAPACITY_INDEX_VERSION:
+                self.entries = {k: int(v) for k, v in data.get("capacity", {}).items()}
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self.entries
+
+    def get(self, digest: str):
+        return self.entries.get(digest)
+
+    def put(self, digest: str, bits: int):
+        if self.entries.get(digest) != bits:
+            self.entries[digest] = bits
+            self.dirty = True
+
+    def lookup(self, path: str, compute):
+        # compute(path) -> ёмкость в битах, вызывается только для новых изображений
+        digest = file_digest(path)
+        bits = self.get(digest)
+        if bits is None:
+            bits = compute(path)
+            self.put(digest, bits)
+        return bits
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CAPACITY_INDEX_VERSION, "capacity": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.save()
+
+def image_capacity(path: str) -> int:
+    from PyQt6.QtGui import QImage
+    from lab4 import compute_capacity
+    return compute_capacity(QImage(path))[0]
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ёмкость IMNP для изображений из папки")
+    parser.add_argument("input_dir", help="папка с изображениями")
+    parser.add_argument("-i", "--index", default=None,
+                        help=f"файл индекса (по умолчанию {CAPACITY_INDEX_NAME} в папке с изображениями)")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"нет такой папки: {args.input_dir}")
+    index_path = args.index or os.path.join(args.input_dir, CAPACITY_INDEX_NAME)
+    total_bits = 0
+    with CapacityIndex(index_path) as index:
+        for fn in sorted(os.listdir(args.input_dir)):
+            if not fn.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            bits = index.lookup(os.path.join(args.input_dir, fn), image_capacity)
+            total_bits += bits
+            print(f"{fn}: {bits} бит ({bits // 8} байт)")
+    print(f"Всего: {total_bits} бит ({total_bits // 8} байт)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,187 +1,404 @@
 import sys, os
-import difflib, math
+import struct
+import concurrent.futures
+from multiprocessing import cpu_count, shared_memory
+from dataclasses import dataclass
+import numpy as np
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QFileDialog, QMessageBox, QTabWidget,
     QPlainTextEdit, QGroupBox, QDialog, QDialogButtonBox
 )
-from PyQt6.QtGui import QPixmap, QImage, QColor
+from PyQt6.QtGui import QPixmap, QImage
 from PyQt6.QtCore import Qt
 
-def text_to_bits(text: str) -> list[int]:
-    data = text.encode('utf-8', errors='replace')
-    bits = []
-    for byte in data:
-        for i in range(8):
-            bit = (byte >> (7 - i)) & 1
-            bits.append(bit)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.qt_arrays import ImageHandle, gray_view, array_to_qimage
+from common.bitbuffer import BitBuffer
+from common.metrics import compare_images
+from common.scoring import score_message, format_score
+from capacity_index import CAPACITY_INDEX_NAME, CapacityIndex
+
+def text_to_bits(text: str) -> BitBuffer:
+    return BitBuffer.from_text(text)
+
+def bits_to_text(bits) -> str:
+    return BitBuffer(bits).to_bytes().decode('utf-8', errors='replace')
+
+@dataclass
+class ImnpBlocks:
+    # параметры всех встраиваемых позиций в порядке обхода: блок за блоком, (x, y+1), (x+1, y), (x+1, y+1)
+    rows: np.ndarray
+    cols: np.ndarray
+    interp: np.ndarray
+    ref: np.ndarray
+    ak: np.ndarray
+
+LENGTH_HEADER = struct.Struct(">I")
+LENGTH_HEADER_BITS = LENGTH_HEADER.size * 8
+# хвост после сообщения: позиция с последним битом заголовка (ak <= 7) всегда
+# попадает в префикс встраивания, и заголовок читается без знания длины
+MESSAGE_PADDING_BITS = 8
+AK_TABLE = np.array([max(v.bit_length() - 1, 0) for v in range(256)], dtype=np.int64)
+
+def block_rows(gray: np.ndarray) -> int:
+    return max((gray.shape[0] - 1) // 2, 0)
+
+def block_corners(gray: np.ndarray, first_block_row: int = 0, last_block_row: int = None):
+    # углы (x, y), (x+2, y), (x, y+2), (x+2, y+2) всех блоков в строках [first_block_row, last_block_row)
+    if last_block_row is None:
+        last_block_row = block_rows(gray)
+    gray = gray[2 * first_block_row:2 * last_block_row + 1]
+    blocks_y = max(last_block_row - first_block_row, 0)
+    blocks_x = max((gray.shape[1] - 1) // 2, 0)
+    a = gray[0:2 * blocks_y:2, 0:2 * blocks_x:2].astype(np.int32)
+    b = gray[0:2 * blocks_y:2, 2:2 * blocks_x + 2:2].astype(np.int32)
+    c = gray[2:2 * blocks_y + 2:2, 0:2 * blocks_x:2].astype(np.int32)
+    d = gray[2:2 * blocks_y + 2:2, 2:2 * blocks_x + 2:2].astype(np.int32)
+    omin = np.minimum(np.minimum(a, b), np.minimum(c, d))
+    omax = np.maximum(np.maximum(a, b), np.maximum(c, d))
+    return a, b, c, d, omin, omax
+
+def imnp_blocks(gray: np.ndarray, first_block_row: int = 0, last_block_row: int = None) -> ImnpBlocks:
+    a, b, c, d, omin, omax = block_corners(gray, first_block_row, last_block_row)
+    row_offset = 2 * first_block_row
+    blocks_y, blocks_x = a.shape
+    c01 = (omax + (a + c) // 2) // 2
+    c10 = (omax + (a + b) // 2) // 2
+    c11 = (c01 + c10) // 2
+    interp = np.stack((c01, c10, c11), axis=-1).reshape(-1)
+    ref = np.stack((np.maximum(a, c), np.maximum(a, b), np.minimum(c10, c01)), axis=-1).reshape(-1)
+    ak = AK_TABLE[np.stack((c01 - omin, c10 - omin, c11 - omin), axis=-1).reshape(-1)]
+    y, x = np.meshgrid(np.arange(row_offset, row_offset + 2 * blocks_y, 2), np.arange(0, 2 * blocks_x, 2), indexing='ij')
+    rows = np.stack((y + 1, y, y + 1), axis=-1).reshape(-1)
+    cols = np.stack((x, x + 1, x + 1), axis=-1).reshape(-1)
+    return ImnpBlocks(rows, cols, interp, ref, ak)
+
+def select_positions(ak: np.ndarray, total_bits: int) -> np.ndarray:
+    # позиция занята, если её ak бит целиком помещаются в остаток сообщения
+    csum = np.cumsum(ak)
+    prefix = int(np.searchsorted(csum, total_bits, side='right'))
+    take = ak > 0
+    take[prefix:] = False
+    remaining = total_bits - (int(csum[prefix - 1]) if prefix else 0)
+    start = prefix
+    while remaining > 0:
+        tail = ak[start:]
+        candidates = np.flatnonzero((tail > 0) & (tail <= remaining))
+        if not candidates.size:
+            break
+        pos = start + int(candidates[0])
+        take[pos] = True
+        remaining -= int(ak[pos])
+        start = pos + 1
+    return take
+
+def gather_values(bits: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    # Rk: lengths[i] бит начиная с offsets[i], старший бит первым
+    padded = np.zeros(len(bits) + 8, dtype=np.int64)
+    padded[:len(bits)] = bits
+    values = np.zeros(len(offsets), dtype=np.int64)
+    for j in range(int(lengths.max(initial=0))):
+        active = j < lengths
+        values[active] = (values[active] << 1) | padded[offsets[active] + j]
+    return values
+
+def iter_imnp_blocks(gray: np.ndarray, chunk_rows: int = 16, max_chunk_rows: int = 1024):
+    total_rows = block_rows(gray)
+    start = 0
+    while start < total_rows:
+        end = min(start + chunk_rows, total_rows)
+        yield imnp_blocks(gray, start, end)
+        start = end
+        chunk_rows = min(chunk_rows * 2, max_chunk_rows)
+
+def position_bits(gray: np.ndarray, blocks: ImnpBlocks, take: np.ndarray) -> np.ndarray:
+    lengths = blocks.ak[take]
+    rk = np.maximum(blocks.ref[take] - gray[blocks.rows[take], blocks.cols[take]], 0)
+    offsets = np.cumsum(lengths) - lengths
+    bits = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for j in range(int(lengths.max(initial=0))):
+        active = j < lengths
+        bits[offsets[active] + j] = (rk[active] >> (lengths[active] - 1 - j)) & 1
     return bits
 
-def bits_to_text(bits: list[int]) -> str:
-    if not bits:
-        return ""
-    r = len(bits) % 8
-    if r != 0:
-        bits += [0] * (8 - r)
-    raw_bytes = bytearray()
-    for i in range(0, len(bits), 8):
-        val = 0
-        for b in bits[i:i+8]:
-            val = (val << 1) | b
-        raw_bytes.append(val)
-    text = raw_bytes.decode('utf-8', errors='replace')
-    return text
-
-def embed_imnp(cover: QImage, bits: list[int]):
+def with_length_header(bits) -> BitBuffer:
+    bits = BitBuffer(bits)
+    header = BitBuffer.from_bytes(LENGTH_HEADER.pack(len(bits)))
+    return header + bits + BitBuffer.zeros(MESSAGE_PADDING_BITS)
+
+def embed_imnp(cover: QImage, bits: BitBuffer):
     if cover.isNull():
         return QImage(), QImage(), []
-    cover_gray = cover.convertToFormat(QImage.Format.Format_Grayscale8)
-    width = cover_gray.width()
-    height = cover_gray.height()
-    stego = cover_gray.copy()
-    inter = cover_gray.copy()
-    embedded_positions = []
-    bit_index = 0
-    for y in range(0, height-2, 2):
-        for x in range(0, width-2, 2):
-            corners = [cover_gray.pixelColor(x, y).red(), cover_gray.pixelColor(x+2, y).red(), cover_gray.pixelColor(x, y+2).red(), cover_gray.pixelColor(x+2, y+2).red()]
-            Omin = min(corners)
-            Omax = max(corners)
-            C00 = cover_gray.pixelColor(x, y).red()
-            C01 = (Omax + ((cover_gray.pixelColor(x, y).red() + cover_gray.pixelColor(x, y+2).red()) // 2)) // 2
-            C10 = (Omax + ((cover_gray.pixelColor(x, y).red() + cover_gray.pixelColor(x+2, y).red()) // 2)) // 2
-            C11 = (C01 + C10) // 2
-            C = [[C00, C01], [C10, C11]]
-            vk1 = C[0][1] - Omin
-            vk2 = C[1][0] - Omin
-            vk3 = C[1][1] - Omin
-            for idx, (dx, dy) in enumerate([(0,1), (1,0), (1,1)]):
-                vk = vk1 if idx == 0 else vk2 if idx == 1 else vk3
-                ak = math.floor(math.log2(vk)) if vk > 0 else 0
-                if ak > 0 and bit_index + ak <= len(bits):
-                    if (dx, dy) == (1,1):
-                        ref = min(C[1][0], C[0][1])
-                    elif (dx, dy) == (0,1):
-                        ref = max(cover_gray.pixelColor(x, y).red(), cover_gray.pixelColor(x, y+2).red())
-                    else:
-                        ref = max(cover_gray.pixelColor(x, y).red(), cover_gray.pixelColor(x+2, y).red())
-                    Rk = 0
-                    for b in bits[bit_index:bit_index+ak]:
-                        Rk = (Rk << 1) | b
-                    bit_index += ak
-                    new_val = ref - Rk
-                    if new_val < 0:
-                        new_val = 0
-                    if new_val > 255:
-                        new_val = 255
-                    stego.setPixelColor(x+dx, y+dy, QColor(new_val, new_val, new_val))
-                    embedded_positions.append((x+dx, y+dy))
-                else:
-                    stego.setPixelColor(x+dx, y+dy, QColor(C[dx][dy], C[dx][dy], C[dx][dy]))
-                inter.setPixelColor(x+dx, y+dy, QColor(C[dx][dy], C[dx][dy], C[dx][dy]))
-    return stego, inter, embedded_positions
-
-def extract_imnp(stego: QImage, msg_length: int):
+    bits = np.asarray(BitBuffer(bits), dtype=np.int64)
+    gray = gray_view(cover)
+    blocks = imnp_blocks(gray)
+    take = select_positions(blocks.ak, len(bits))
+    lengths = blocks.ak[take]
+    offsets = np.cumsum(lengths) - lengths
+    values = blocks.interp.copy()
+    values[take] = np.clip(blocks.ref[take] - gather_values(bits, offsets, lengths), 0, 255)
+    stego = gray.copy()
+    inter = gray.copy()
+    stego[blocks.rows, blocks.cols] = values
+    inter[blocks.rows, blocks.cols] = blocks.interp
+    embedded_positions = np.stack((blocks.cols[take], blocks.rows[take]), axis=-1)
+    return array_to_qimage(stego), array_to_qimage(inter), embedded_positions
+
+def extract_imnp_bits(gray: np.ndarray, total_bits: int) -> np.ndarray:
+    # читаются только строки блоков, нужные для total_bits
+    parts = []
+    remaining = total_bits
+    for blocks in iter_imnp_blocks(gray):
+        if remaining <= 0:
+            break
+        bits = position_bits(gray, blocks, select_positions(blocks.ak, remaining))
+        parts.append(bits)
+        remaining -= len(bits)
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+
+def extract_imnp(stego: QImage, n_bits: int) -> BitBuffer:
+    if stego.isNull():
+        return BitBuffer()
+    return BitBuffer(extract_imnp_bits(gray_view(stego), n_bits))
+
+def read_length_header(gray: np.ndarray):
+    parts = []
+    count = 0
+    for blocks in iter_imnp_blocks(gray):
+        bits = position_bits(gray, blocks, blocks.ak > 0)
+        parts.append(bits)
+        count += len(bits)
+        if count >= LENGTH_HEADER_BITS:
+            header = BitBuffer(np.concatenate(parts)[:LENGTH_HEADER_BITS]).to_bytes()
+            return LENGTH_HEADER.unpack(header)[0]
+    return None
+
+def extract_imnp_message(stego: QImage, workers: int = 1) -> BitBuffer:
     if stego.isNull():
-        return []
-    cover_gray = stego.convertToFormat(QImage.Format.Format_Grayscale8)
-    width = cover_gray.width()
-    height = cover_gray.height()
-    total_bits = msg_length * 8
-    bits = []
-    extracted = 0
-    for y in range(0, height-2, 2):
-        for x in range(0, width-2, 2):
-            corners = [cover_gray.pixelColor(x, y).red(), cover_gray.pixelColor(x+2, y).red(), cover_gray.pixelColor(x, y+2).red(), cover_gray.pixelColor(x+2, y+2).red()]
-            Omin = min(corners)
-            Omax = max(corners)
-            C00 = cover_gray.pixelColor(x, y).red()
-            C01 = (Omax + ((cover_gray.pixelColor(x, y).red() + cover_gray.pixelColor(x, y+2).red()) // 2)) // 2
-            C10 = (Omax + ((cover_gray.pixelColor(x, y).red() + cover_gray.pixelColor(x+2, y).red()) // 2)) // 2
-            C11 = (C01 + C10) // 2
-            C = [[C00, C01], [C10, C11]]
-            vk1 = C[0][1] - Omin
-            vk2 = C[1][0] - Omin
-            vk3 = C[1][1] - Omin
-            for idx, (dx, dy) in enumerate([(0,1), (1,0), (1,1)]):
-                if extracted >= total_bits:
-                    break
-                vk = vk1 if idx == 0 else vk2 if idx == 1 else vk3
-                ak = math.floor(math.log2(vk)) if vk > 0 else 0
-                if ak > 0 and extracted + ak <= total_bits:
-                    if (dx, dy) == (1,1):
-                        ref = min(C[1][0], C[0][1])
-                    elif (dx, dy) == (0,1):
-                        ref = max(cover_gray.pixelColor(x, y).red(), cover_gray.pixelColor(x, y+2).red())
-                    else:
-                        ref = max(cover_gray.pixelColor(x, y).red(), cover_gray.pixelColor(x+2, y).red())
-                    Rk = ref - cover_gray.pixelColor(x+dx, y+dy).red()
-                    if Rk < 0:
-                        Rk = 0
-                    for pos in range(ak-1, -1, -1):
-                        bit = (Rk >> pos) & 1
-                        bits.append(bit)
-                    extracted += ak
-    return bits[:total_bits]
+        return BitBuffer()
+    gray = gray_view(stego)
+    length = read_length_header(gray)
+    if length is None:
+        return BitBuffer()
+    total_bits = LENGTH_HEADER_BITS + length + MESSAGE_PADDING_BITS
+    if workers > 1:
+        bits = extract_imnp_parallel(stego, total_bits, workers)
+    else:
+        bits = BitBuffer(extract_imnp_bits(gray, total_bits))
+    if len(bits) < LENGTH_HEADER_BITS + length:
+        return BitBuffer()
+    return bits[LENGTH_HEADER_BITS:LENGTH_HEADER_BITS + length]
+
+def embedded_bits(gray: np.ndarray, total_bits: int) -> int:
+    # сколько бит из total_bits реально встроит embed_imnp (жадный выбор может оставить хвост)
+    remaining = total_bits
+    for blocks in iter_imnp_blocks(gray):
+        if remaining <= 0:
+            break
+        remaining -= int(blocks.ak[select_positions(blocks.ak, remaining)].sum())
+    return total_bits - remaining
+
+def capacity_bits(gray: np.ndarray, first_block_row: int = 0, last_block_row: int = None) -> int:
+    a, b, c, d, omin, omax = block_corners(gray, first_block_row, last_block_row)
+    # оценка ёмкости: для третьей позиции берётся (Omax + (p01 + p10) // 2) // 2
+    vk1 = (omax + (a + c) // 2) // 2 - omin
+    vk2 = (omax + (a + b) // 2) // 2 - omin
+    vk3 = (omax + (b + c) // 2) // 2 - omin
+    return int(AK_TABLE[vk1].sum() + AK_TABLE[vk2].sum() + AK_TABLE[vk3].sum())
 
 def compute_capacity(cover: QImage):
-    gray = cover.convertToFormat(QImage.Format.Format_Grayscale8)
-    w, h = gray.width(), gray.height()
-    total_bits = 0
-    for y in range(0, h-2, 2):
-        for x in range(0, w-2, 2):
-            # читаем четыре угловых пикселя
-            p00 = gray.pixelColor(x,   y).red()
-            p01 = gray.pixelColor(x+2, y).red()
-            p10 = gray.pixelColor(x,   y+2).red()
-            p11 = gray.pixelColor(x+2, y+2).red()
-            Omin = min(p00, p01, p10, p11)
-            # вычисляем vk для трёх встраиваемых позиций
-            vk1 = ((Omin := Omin) or 1) and (( (Omax:=max(p00,p01,p10,p11)) + ((p00 + p10)//2) )//2 - Omin)
-            vk2 = (Omax + ((p00 + p01)//2))//2 - Omin
-            vk3 = (( (Omax) + ((p01 + p10)//2) )//2) - Omin
-            for vk in (vk1, vk2, vk3):
-                if vk > 1:
-                    total_bits += math.floor(math.log2(vk))
+    if cover.isNull():
+        return 0, 0
+    total_bits = capacity_bits(gray_view(cover))
     return total_bits, total_bits // 8
 
-
-def compute_psnr(cover: QImage, stego: QImage):
-    cover_gray = cover.convertToFormat(QImage.Format.Format_Grayscale8)
-    stego_gray = stego.convertToFormat(QImage.Format.Format_Grayscale8)
-    width, height = cover_gray.width(), cover_gray.height()
-    mse = 0
-    for y in range(height):
-        for x in range(width):
-            diff = cover_gray.pixelColor(x, y).red() - stego_gray.pixelColor(x, y).red()
-            mse += diff * diff
-    mse /= (width * height)
-    if mse == 0:
-        return float('inf')
-    return 10 * math.log10((255 ** 2) / mse)
-
-def create_diff_image(cover: QImage, stego: QImage):
-    cover_gray = cover.convertToFormat(QImage.Format.Format_Grayscale8)
-    stego_gray = stego.convertToFormat(QImage.Format.Format_Grayscale8)
-    width, height = cover_gray.width(), cover_gray.height()
-    diff_img = QImage(width, height, QImage.Format.Format_Grayscale8)
-    for y in range(height):
-        for x in range(width):
-            diff = abs(cover_gray.pixelColor(x, y).red() - stego_gray.pixelColor(x, y).red())
-            diff_img.setPixelColor(x, y, QColor(diff, diff, diff))
-    return diff_img
+PARALLEL_MIN_PIXELS = 16_000_000
+STRIP_BLOCK_ROWS = 256
+
+class _SharedBuffer:
+    # держит SharedMemory открытой, пока жив ndarray поверх её буфера
+    def __init__(self, shm: shared_memory.SharedMemory, shape):
+        self.shm = shm
+        address = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf).ctypes.data
+        self.__array_interface__ = {
+            "shape": shape,
+            "typestr": "|u1",
+            "data": (address, False),
+            "version": 3,
+        }
+
+class SharedArray:
+    # uint8-массив в разделяемой памяти; воркеры открывают его по (name, shape)
+    def __init__(self, shape, name: str = None):
+        self.shape = tuple(shape)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(self.shape)), 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def spec(self):
+        return self.shm.name, self.shape
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        self.shm.unlink()
+
+    def detach(self) -> np.ndarray:
+        # имя удаляется сразу, а сама память живёт, пока жив возвращённый массив
+        self.array = None
+        self.shm.unlink()
+        detached = np.asarray(_SharedBuffer(self.shm, self.shape))
+        self.shm = None
+        return detached
+
+def parallel_workers(image) -> int:
+    if image.isNull() or image.width() * image.height() < PARALLEL_MIN_PIXELS:
+        return 1
+    return cpu_count()
+
+def strip_ranges(total_rows: int, workers: int) -> list[tuple[int, int]]:
+    # полосы по строкам блоков: полоса [first, last) пишет только строки 2*first .. 2*last-1,
+    # а строку углов 2*last лишь читает, поэтому полосы не пересекаются по записи
+    strip_rows = min(STRIP_BLOCK_ROWS, max(1, -(-total_rows // (4 * workers))))
+    return [(first, min(first + strip_rows, total_rows)) for first in range(0, total_rows, strip_rows)]
+
+def strip_capacity(task) -> int:
+    image_spec, first, last = task
+    image = SharedArray(image_spec[1], name=image_spec[0])
+    try:
+        return int(imnp_blocks(image.array, first, last).ak.sum())
+    finally:
+        image.close()
+
+def plan_strips(gray: np.ndarray, strips, capacities, total_bits: int) -> tuple[list[tuple[int, int]], int]:
+    # смещение первого бита и бюджет каждой полосы; полосы до переполнения берут
+    # все свои позиции, жадный хвост после переполнения считается последовательно.
+    # Второе значение - сколько бит из total_bits поместится всего
+    plan = []
+    offset = 0
+    remaining = total_bits
+    for (first, last), capacity in zip(strips, capacities):
+        plan.append((offset, remaining))
+        if remaining >= capacity:
+            used = capacity
+        elif remaining > 0:
+            ak = imnp_blocks(gray, first, last).ak
+            used = int(ak[select_positions(ak, remaining)].sum())
+        else:
+            used = 0
+        offset += used
+        remaining -= used
+    return plan, offset
+
+def embed_strip(task) -> np.ndarray:
+    stego_spec, inter_spec, bits_spec, first, last, offset, budget = task
+    stego = SharedArray(stego_spec[1], name=stego_spec[0])
+    inter = SharedArray(inter_spec[1], name=inter_spec[0])
+    packed = SharedArray(bits_spec[1], name=bits_spec[0])
+    try:
+        # углы блоков (чётные строки и столбцы) не меняются, поэтому читаются прямо из stego
+        blocks = imnp_blocks(stego.array, first, last)
+        take = select_positions(blocks.ak, budget)
+        lengths = blocks.ak[take]
+        used = int(lengths.sum())
+        shift = offset % 8
+        bits = np.unpackbits(packed.array[offset // 8:(offset + used + 7) // 8])[shift:shift + used]
+        values = blocks.interp.copy()
+        values[take] = np.clip(blocks.ref[take] - gather_values(bits, np.cumsum(lengths) - lengths, lengths), 0, 255)
+        stego.array[blocks.rows, blocks.cols] = values
+        inter.array[blocks.rows, blocks.cols] = blocks.interp
+        return np.stack((blocks.cols[take], blocks.rows[take]), axis=-1)
+    finally:
+        stego.close()
+        inter.close()
+        packed.close()
+
+def extract_strip(task):
+    stego_spec, first, last, offset, budget = task
+    stego = SharedArray(stego_spec[1], name=stego_spec[0])
+    try:
+        blocks = imnp_blocks(stego.array, first, last)
+        bits = position_bits(stego.array, blocks, select_positions(blocks.ak, budget))
+        return offset, len(bits), np.packbits(bits)
+    finally:
+        stego.close()
+
+def shared_copy(arr: np.ndarray) -> SharedArray:
+    shared = SharedArray(arr.shape)
+    shared.array[:] = arr
+    return shared
+
+def embed_imnp_parallel(cover: QImage, bits: BitBuffer, workers: int = None):
+    # в отличие от embed_imnp не встраивает усечённое сообщение: при нехватке ёмкости - пустые QImage
+    if cover.isNull():
+        return QImage(), QImage(), []
+    workers = workers or cpu_count()
+    bits = BitBuffer(bits)
+    gray = gray_view(cover)
+    stego = shared_copy(gray)
+    inter = shared_copy(gray)
+    packed = shared_copy(bits.data)
+    try:
+        strips = strip_ranges(block_rows(gray), workers)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            capacities = list(executor.map(strip_capacity, [(stego.spec, first, last) for first, last in strips]))
+            plan, planned = plan_strips(gray, strips, capacities, len(bits))
+            if planned < len(bits):
+                return QImage(), QImage(), []
+            tasks = [(stego.spec, inter.spec, packed.spec, first, last, offset, budget)
+                     for (first, last), (offset, budget) in zip(strips, plan)]
+            parts = list(executor.map(embed_strip, tasks))
+        embedded_positions = np.concatenate(parts) if parts else np.zeros((0, 2), dtype=np.int64)
+        # результат остаётся в разделяемой памяти: без копий stego и inter
+        return array_to_qimage(stego.detach()), array_to_qimage(inter.detach()), embedded_positions
+    finally:
+        packed.unlink()
+        for shared in (stego, inter):
+            if shared.shm is not None:
+                shared.unlink()
+
+def extract_imnp_parallel(stego: QImage, total_bits: int, workers: int = None) -> BitBuffer:
+    if stego.isNull():
+        return BitBuffer()
+    workers = workers or cpu_count()
+    gray = gray_view(stego)
+    shared = shared_copy(gray)
+    try:
+        strips = strip_ranges(block_rows(gray), workers)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            capacities = list(executor.map(strip_capacity, [(shared.spec, first, last) for first, last in strips]))
+            total_bits = min(total_bits, sum(capacities))
+            plan, _ = plan_strips(gray, strips, capacities, total_bits)
+            tasks = [(shared.spec, first, last, offset, budget)
+                     for (first, last), (offset, budget) in zip(strips, plan) if budget > 0]
+            out = np.zeros(total_bits, dtype=np.uint8)
+            extracted = 0
+            for offset, count, packed in executor.map(extract_strip, tasks):
+                out[offset:offset + count] = np.unpackbits(packed, count=count)
+                extracted = max(extracted, offset + count)
+        return BitBuffer(out[:extracted])
+    finally:
+        shared.unlink()
 
 class IMNP(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("IMNP")
         self.resize(1200, 600)
-        self.original_image = QImage()
-        self.processed_image = QImage()
-        self.interpolated_image = QImage()
+        self.original_image = ImageHandle()
+        self.processed_image = ImageHandle()
+        self.interpolated_image = ImageHandle()
         self.used_indices = []
         self.last_embedded_text = ""
         self.last_saved_filepath = ""
+        self.last_extracted_payload = BitBuffer()
         self.init_ui()
 
     def init_ui(self):
@@ -333,7 +550,7 @@ class IMNP(QMainWindow):
             if image.isNull():
                 QMessageBox.warning(self, "Ошибка", "Не удалось открыть!")
                 return
-            self.original_image = image
+            self.original_image.image = image
             self.lbl_original_path.setText(file_path)
             pixmap = QPixmap.fromImage(image).scaled(
                 self.lbl_original_display.size(),
@@ -351,15 +568,23 @@ class IMNP(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Введите текст!")
             return
         bits = text_to_bits(message_text)
-        result_image, inter_img, used_idx = embed_imnp(self.original_image, bits)
+        framed = with_length_header(bits)
+        workers = parallel_workers(self.original_image)
+        if workers > 1:
+            # ёмкость проверяется по плану полос внутри embed_imnp_parallel
+            result_image, inter_img, used_idx = embed_imnp_parallel(self.original_image, framed, workers)
+        elif embedded_bits(self.original_image.view(QImage.Format.Format_Grayscale8), len(framed)) < len(framed):
+            result_image = QImage()
+        else:
+            result_image, inter_img, used_idx = embed_imnp(self.original_image, framed)
         if result_image.isNull():
-            QMessageBox.warning(self, "Ошибка", "Недостаточно пикселей для встраивания!")
+            QMessageBox.warning(self, "Ошибка", "Недостаточно ёмкости: сообщение с заголовком длины не помещается в изображение!")
             return
-        self.processed_image = result_image
-        self.interpolated_image = inter_img
+        self.processed_image.image = result_image
+        self.interpolated_image.image = inter_img
         self.used_indices = used_idx
         self.last_embedded_text = message_text
-        pix_original = QPixmap.fromImage(self.original_image).scaled(
+        pix_original = QPixmap.fromImage(self.original_image.image).scaled(
             self.lbl_original_display.size(),
             Qt.AspectRatioMode.KeepAspectRatio,
             Qt.TransformationMode.SmoothTransformation
@@ -371,14 +596,11 @@ class IMNP(QMainWindow):
             Qt.TransformationMode.SmoothTransformation
         )
         self.lbl_processed_display.setPixmap(pix_processed)
-        width = self.original_image.convertToFormat(QImage.Format.Format_Grayscale8).width()
-        height = self.original_image.convertToFormat(QImage.Format.Format_Grayscale8).height()
-        diff_sum = 0
-        for y in range(height):
-            for x in range(width):
-                diff_sum += abs(self.original_image.convertToFormat(QImage.Format.Format_Grayscale8).pixelColor(x, y).red() - self.processed_image.convertToFormat(QImage.Format.Format_Grayscale8).pixelColor(x, y).red())
-        avg_diff = diff_sum / (width * height) if (width * height) else 0
-        perc_all = (avg_diff / 255) * 100
+        metrics = compare_images(self.original_image, self.processed_image)
+        if metrics is None:
+            QMessageBox.warning(self, "Ошибка", "Размеры изображений не совпадают!")
+            return
+        perc_all = (metrics.mae / 255) * 100
         self.lbl_diff_all.setText(f"Изменение по всем пикселям: {perc_all:.4f}%")
         bits_count = len(bits)
         bytes_count = bits_count // 8
@@ -398,7 +620,7 @@ class IMNP(QMainWindow):
         base_name = os.path.splitext(os.path.basename(self.lbl_original_path.text()))[0]
         filename = f"{base_name}_IMNP.bmp"
         save_path = os.path.join(folder, filename).replace("\\", "/")
-        if self.processed_image.save(save_path, "BMP"):
+        if self.processed_image.image.save(save_path, "BMP"):
             self.last_saved_filepath = save_path
             QMessageBox.information(self, "OK", f"Файл сохранен: {save_path}")
         else:
@@ -416,7 +638,8 @@ class IMNP(QMainWindow):
             if image.isNull():
                 QMessageBox.warning(self, "Ошибка", "Не удалось загрузить!")
                 return
-            self.processed_image = image
+            self.processed_image.image = image
+            self.last_extracted_payload = BitBuffer()
             self.lbl_embedded_path.setText(file_path)
             pixmap = QPixmap.fromImage(image).scaled(
                 self.lbl_embedded_display.size(),
@@ -429,8 +652,8 @@ class IMNP(QMainWindow):
         if self.processed_image.isNull():
             QMessageBox.warning(self, "Ошибка", "Нет изображения для извлечения!")
             return
-        raw_bits = extract_imnp(self.processed_image, len(self.last_embedded_text))
-        extracted_text = bits_to_text(raw_bits)
+        self.last_extracted_payload = extract_imnp_message(self.processed_image, parallel_workers(self.processed_image))
+        extracted_text = bits_to_text(self.last_extracted_payload)
         self.txt_extracted.setPlainText(extracted_text)
         QMessageBox.information(self, "OK", "Сообщение извлечено.")
 
@@ -443,23 +666,23 @@ class IMNP(QMainWindow):
         if loaded_filename != last_saved_filename:
             QMessageBox.warning(self, "Ошибка", "Загруженный файл не совпадает с последним сохранённым!")
             return
-        original_text = self.last_embedded_text
-        extracted_text = self.txt_extracted.toPlainText()
-        if not original_text or not extracted_text:
+        score = score_message(self.last_embedded_text, self.last_extracted_payload)
+        if score is None:
             QMessageBox.warning(self, "Ошибка", "Отсутствует оригинальный или извлечённый текст!")
             return
-        sequence_matcher = difflib.SequenceMatcher(None, original_text, extracted_text)
-        ratio = sequence_matcher.ratio()
-        error_percent = (1 - ratio) * 100
-        QMessageBox.information(self, "Результат", f"Ошибка в извлечении: {error_percent:.2f}%")
+        QMessageBox.information(self, "Результат", format_score(score))
 
     def visual_analysis(self):
         if self.original_image.isNull() or self.processed_image.isNull():
             QMessageBox.warning(self, "Ошибка", "Необходимо загрузить оригинальное и стего-изображение!")
             return
         cap_bits, cap_bytes = compute_capacity(self.interpolated_image)
-        psnr_val = compute_psnr(self.interpolated_image, self.processed_image)
-        diff_img = create_diff_image(self.interpolated_image, self.processed_image)
+        metrics = compare_images(self.interpolated_image, self.processed_image)
+        if metrics is None:
+            QMessageBox.warning(self, "Ошибка", "Размеры изображений не совпадают!")
+            return
+        psnr_val = metrics.psnr
+        diff_img = metrics.diff_image()
 
         dialog = QDialog(self)
         dialog.setWindowTitle("Визуальный анализ стегоконтейнера")
@@ -475,7 +698,7 @@ class IMNP(QMainWindow):
         label_orig_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
         v_layout_orig.addWidget(label_orig_title)
         lbl_orig = QLabel()
-        pix_orig = QPixmap.fromImage(self.interpolated_image).scaled(300, 300, Qt.AspectRatioMode.KeepAspectRatio)
+        pix_orig = QPixmap.fromImage(self.interpolated_image.image).scaled(300, 300, Qt.AspectRatioMode.KeepAspectRatio)
         lbl_orig.setPixmap(pix_orig)
         lbl_orig.setAlignment(Qt.AlignmentFlag.AlignCenter)
         v_layout_orig.addWidget(lbl_orig)
@@ -486,7 +709,7 @@ class IMNP(QMainWindow):
         label_stego_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
         v_layout_stego.addWidget(label_stego_title)
         lbl_stego = QLabel()
-        pix_stego = QPixmap.fromImage(self.processed_image).scaled(300, 300, Qt.AspectRatioMode.KeepAspectRatio)
+        pix_stego = QPixmap.fromImage(self.processed_image.image).scaled(300, 300, Qt.AspectRatioMode.KeepAspectRatio)
         lbl_stego.setPixmap(pix_stego)
         lbl_stego.setAlignment(Qt.AlignmentFlag.AlignCenter)
         v_layout_stego.addWidget(lbl_stego)
@@ -530,19 +753,20 @@ class IMNP(QMainWindow):
             return
         percents = [int(p) for p in self.txt_percents.toPlainText().split(',') if p.strip().isdigit()]
         os.makedirs(self.output_dir, exist_ok=True)
-        for fn in os.listdir(self.input_dir):
-            path = os.path.join(self.input_dir, fn)
-            img = QImage(path)
-            if img.isNull(): continue
-            cap_bits, _ = compute_capacity(img)
-            base, ext = os.path.splitext(fn)
-            fmt = ext.lstrip('.').upper()
-            for p in percents:
-                n = cap_bits * p // 100
-                bits = [0] * n
-                result_image, inter_img, used_idx = embed_imnp(img, bits)
-                out = os.path.join(self.output_dir, f"{base}_lab4_stego_{p}.{fmt}")
-                result_image.save(out, fmt)
+        with CapacityIndex(os.path.join(self.output_dir, CAPACITY_INDEX_NAME)) as index:
+            for fn in os.listdir(self.input_dir):
+                path = os.path.join(self.input_dir, fn)
+                img = ImageHandle(QImage(path))
+                if img.isNull(): continue
+                cap_bits = index.lookup(path, lambda _: compute_capacity(img)[0])
+                base, ext = os.path.splitext(fn)
+                fmt = ext.lstrip('.').upper()
+                for p in percents:
+                    n = cap_bits * p // 100
+                    bits = BitBuffer.zeros(n)
+                    result_image, inter_img, used_idx = embed_imnp(img, bits)
+                    out = os.path.join(self.output_dir, f"{base}_lab4_stego_{p}.{fmt}")
+                    result_image.save(out, fmt)
         QMessageBox.information(self, "OK", "Генерация завершена")
 
             
@@ -1,54 +1,54 @@
+import sys, os
+from functools import lru_cache
 import numpy as np
-from PyQt6.QtGui import QImage, QColor
+from PyQt6.QtGui import QImage
 
-def aump_analysis(image: QImage, m: int = 16, d: int = 2) -> float:
-    arr = np.zeros((image.height(), image.width()), dtype=np.float64)
-    for y in range(image.height()):
-        for x in range(image.width()):
-            arr[y, x] = QColor(image.pixel(x, y)).red()
-    X = arr.copy()
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.qt_arrays import red_view
+
+@lru_cache(maxsize=None)
+def aump_projectors(m: int, d: int, dtype=np.float64) -> np.ndarray:
+    # I - H(H^T H)^-1 H^T зависит только от (m, d)
+    q = d + 1
+    H = np.zeros((m, q))
+    x_vals = np.linspace(1/m, 1, m)
+    for i in range(q):
+        H[:, i] = x_vals ** i
+    residual = (np.eye(m) - H @ np.linalg.pinv(H)).astype(dtype)
+    residual.flags.writeable = False
+    return residual
+
+def aump_analysis(image: QImage, m: int = 16, d: int = 2, dtype=np.float64) -> float:
+    # dtype=np.float32 вдвое уменьшает память на больших изображениях
+    gray = red_view(image)
+    X = gray.astype(dtype)
     Xpred, w = pred_aump(X, m, d)
     r = X - Xpred
-    Xbar = X + 1 - 2 * (X.astype(int) % 2)
-    beta = np.sum(w * (X - Xbar) * r)
+    # X - Xbar, где Xbar - X с инвертированным LSB: +1 для нечётных, -1 для чётных
+    sign = (gray & 1).astype(dtype) * 2 - 1
+    beta = np.sum(w * sign * r)
     return beta
 
 def pred_aump(X: np.ndarray, m: int, d: int) -> tuple:
     sig_th = 1.0
     q = d + 1
-    h, w_img = X.shape
-    Kn = (h * w_img) // m
-    H = np.zeros((m, q))
-    x_vals = np.linspace(1/m, 1, m)
-    for i in range(q):
-        H[:, i] = x_vals ** i
-    Y = np.zeros((m, Kn))
-    count = 0
-    for i in range(h):
-        for j in range(w_img):
-            block_idx = count // m
-            row_in_block = count % m
-            Y[row_in_block, block_idx] = X[i, j]
-            count += 1
-    p = np.linalg.lstsq(H, Y, rcond=None)[0]
-    Ypred = H @ p
-    Xpred = np.zeros_like(X)
-    count = 0
-    for i in range(h):
-        for j in range(w_img):
-            block_idx = count // m
-            row_in_block = count % m
-            Xpred[i, j] = Ypred[row_in_block, block_idx]
-            count += 1
-    sig2 = np.sum((Y - Ypred) ** 2, axis=0) / (m - q)
+    Kn = X.size // m
+    # блоки - подряд идущие m пикселей в порядке обхода строк: столбец k матрицы Y = flat[k*m:(k+1)*m]
+    flat = X.ravel()
+    covered = Kn * m
+    Y = flat[:covered].reshape(Kn, m).T
+    Xpred = X.copy()
+    w_full = np.zeros_like(X)
+    if Kn == 0:
+        return Xpred, w_full
+    residual = aump_projectors(m, d, X.dtype.type)
+    R = residual @ Y
+    Ypred = Y - R
+    sig2 = np.sum(R ** 2, axis=0) / (m - q)
     sig2 = np.maximum(sig_th ** 2, sig2)
     s_n2 = Kn / np.sum(1.0 / sig2)
     w_block = np.sqrt(s_n2 / (Kn * (m - q))) / sig2
-    w_full = np.zeros_like(X)
-    count = 0
-    for i in range(h):
-        for j in range(w_img):
-            block_idx = count // m
-            w_full[i, j] = w_block[block_idx]
-            count += 1
+    # хвост из h*w - Kn*m пикселей не образует блока: предсказание = сам пиксель, вес 0
+    Xpred.reshape(-1)[:covered] = Ypred.T.ravel()
+    w_full.reshape(-1)[:covered] = np.repeat(w_block, m)
     return Xpred, w_full
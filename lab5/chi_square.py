@@ -1,3 +1,4 @@
+import math
 import numpy as np
 from PyQt6.QtGui import QImage
 
@@ -19,15 +20,139 @@ def image_to_array(image: QImage) -> np.ndarray:
         arr = np.array(ptr).reshape(converted.height(), converted.width(), 4)
         return arr[:, :, 2]
 
+# плотная гистограмма - 256 счётчиков int64 на блок, т.е. 2048 / block_pixels байт на пиксель:
+# для блока 8x8 это 32 Б/пиксель, с 16x16 - не больше 8 Б/пиксель, как и сами ключи;
+# для более мелких блоков считаются только ненулевые пары (блок, значение)
+DENSE_MIN_BLOCK_PIXELS = 256
+
+def block_keys(arr: np.ndarray, block_size: int) -> np.ndarray:
+    # block_id * 256 + значение для каждого пикселя целых блоков
+    h, w = arr.shape
+    rows, cols = h // block_size, w // block_size
+    blocks = arr[:rows * block_size, :cols * block_size].reshape(rows, block_size, cols, block_size)
+    block_ids = np.arange(rows * cols, dtype=np.int64).reshape(rows, 1, cols, 1)
+    return (block_ids * 256 + blocks).ravel()
+
+def block_histograms(arr: np.ndarray, block_size: int) -> np.ndarray:
+    h, w = arr.shape
+    rows, cols = h // block_size, w // block_size
+    counts = np.bincount(block_keys(arr, block_size), minlength=rows * cols * 256)
+    return counts.reshape(rows, cols, 256)
+
+def chi_square_from_histograms(hist: np.ndarray, block_pixels: int) -> np.ndarray:
+    expected = block_pixels / 256
+    return np.sum((hist - expected) ** 2 / expected, axis=-1)
+
+def sparse_chi_square(arr: np.ndarray, block_size: int) -> np.ndarray:
+    # sum((o - e)^2 / e) = sum(o^2) / e - n
+    h, w = arr.shape
+    rows, cols = h // block_size, w // block_size
+    block_pixels = block_size * block_size
+    keys, counts = np.unique(block_keys(arr, block_size), return_counts=True)
+    squares = np.bincount(keys // 256, weights=counts.astype(np.float64) ** 2, minlength=rows * cols)
+    return (squares / (block_pixels / 256) - block_pixels).reshape(rows, cols)
+
 def chi_square_analysis(image: QImage, block_size: int = 16) -> np.ndarray:
     arr = image_to_array(image)
     h, w = arr.shape
     rows, cols = h // block_size, w // block_size
-    chi_values = np.zeros((rows, cols))
-    for i in range(rows):
-        for j in range(cols):
-            block = arr[i*block_size:(i+1)*block_size, j*block_size:(j+1)*block_size]
-            observed, _ = np.histogram(block, bins=256, range=(0, 256))
-            expected = np.full(observed.shape, block.size / 256)
-            chi_values[i, j] = np.sum((observed - expected) ** 2 / expected)
-    return chi_values
+    block_pixels = block_size * block_size
+    if rows == 0 or cols == 0:
+        return np.zeros((rows, cols))
+    if block_pixels >= DENSE_MIN_BLOCK_PIXELS:
+        return chi_square_from_histograms(block_histograms(arr, block_size), block_pixels)
+    return sparse_chi_square(arr, block_size)
+
+PYRAMID_BLOCK_SIZES = (8, 16, 32, 64)
+
+def aggregate_histograms(hist: np.ndarray) -> np.ndarray:
+    # сумма гистограмм 2x2 соседних блоков -> блоки вдвое крупнее
+    rows, cols = hist.shape[0] // 2, hist.shape[1] // 2
+    return hist[:2 * rows, :2 * cols].reshape(rows, 2, cols, 2, 256).sum(axis=(1, 3))
+
+def chi_square_pyramid(image: QImage, block_sizes=PYRAMID_BLOCK_SIZES) -> dict[int, np.ndarray]:
+    # мелкие блоки считаются по разреженному пути; плотные гистограммы строятся один раз
+    # для первого блока от DENSE_MIN_BLOCK_PIXELS, крупные масштабы - их суммированием
+    block_sizes = sorted(block_sizes)
+    base = block_sizes[0]
+    for size in block_sizes:
+        if size % base or (size // base) & (size // base - 1):
+            raise ValueError(f"Размер блока {size} не равен {base} * 2^k")
+    arr = image_to_array(image)
+    h, w = arr.shape
+    maps = {}
+    dense_sizes = [size for size in block_sizes if size * size >= DENSE_MIN_BLOCK_PIXELS]
+    for size in block_sizes:
+        if size * size < DENSE_MIN_BLOCK_PIXELS:
+            if h // size == 0 or w // size == 0:
+                maps[size] = np.zeros((h // size, w // size))
+            else:
+                maps[size] = sparse_chi_square(arr, size)
+    if not dense_sizes:
+        return maps
+    size = dense_sizes[0]
+    hist = block_histograms(arr, size)
+    while True:
+        if size in block_sizes:
+            maps[size] = chi_square_from_histograms(hist, size * size)
+        if size == dense_sizes[-1]:
+            return maps
+        hist = aggregate_histograms(hist)
+        size *= 2
+
+def chi2_sf(x: float, df: int) -> float:
+    # P(chi2_df > x) = Q(df/2, x/2), регуляризованная верхняя неполная гамма-функция
+    if x <= 0:
+        return 1.0
+    a, x = df / 2, x / 2
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1.0 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+    # непрерывная дробь (метод Ленца)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return min(1.0, math.exp(log_prefix) * h)
+
+def pairs_of_values_pvalue(hist: np.ndarray) -> float:
+    # атака Вестфельда: при полном LSB-встраивании частоты пар (2i, 2i+1) выравниваются и p -> 1
+    observed = hist[0::2].astype(np.float64)
+    expected = (hist[0::2] + hist[1::2]) / 2
+    used = expected > 4
+    categories = int(used.sum())
+    if categories < 2:
+        return 0.0
+    chi = float(np.sum((observed[used] - expected[used]) ** 2 / expected[used]))
+    return chi2_sf(chi, categories - 1)
+
+def pairs_of_values_curve(image: QImage, steps: int = 20) -> tuple[np.ndarray, np.ndarray]:
+    # p-value для первых 1/steps, 2/steps, ..., всех пикселей в порядке обхода строк
+    values = image_to_array(image).ravel()
+    n = values.size
+    fractions = np.arange(1, steps + 1) / steps
+    if n == 0:
+        return fractions, np.zeros(steps)
+    chunk_ids = np.arange(n, dtype=np.int64) * steps // n
+    counts = np.bincount(chunk_ids * 256 + values, minlength=steps * 256).reshape(steps, 256)
+    prefix = np.cumsum(counts, axis=0)
+    return fractions, np.array([pairs_of_values_pvalue(h) for h in prefix])
@@ -11,8 +11,8 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import QPixmap, QImage
 from PyQt6.QtCore import Qt
 
-from visual_attack import create_bit_image
-from chi_square import chi_square_analysis
+from visual_attack import bit_plane_images
+from chi_square import chi_square_analysis, chi_square_pyramid, pairs_of_values_curve
 from rs_analysis import rs_analysis, RSAnalysis
 from aump import aump_analysis
 
@@ -114,11 +114,10 @@ class SteganalysisInterface(QMainWindow):
             if image.isNull():
                 QMessageBox.warning(self, "Ошибка", "Не удалось загрузить изображение!")
                 return
-            bit_planes = []
-            for bit in range(8):
-                bp = create_bit_image(image, bit)
-                bit_planes.append(bp)
-            chi_values = chi_square_analysis(image)
+            bit_planes = bit_plane_images(image)
+            chi_maps = chi_square_pyramid(image)
+            chi_values = chi_maps[16]
+            fractions, p_values = pairs_of_values_curve(image, steps=10)
             np.set_printoptions(threshold=np.inf)
             chi_matrix_text = np.array2string(chi_values, precision=2, separator=", ")
             rs_results = rs_analysis(image, overlap=True)
@@ -133,6 +132,12 @@ class SteganalysisInterface(QMainWindow):
             info_text = (
                 f"Среднее значение Хи-квадрат: {chi_values.mean():.2f}\n"
                 f"Матрица Хи-квадрат: \n{chi_matrix_text}\n\n"
+                "Среднее Хи-квадрат по размерам блоков: "
+                + ", ".join(f"{size}: {chi_map.mean():.2f}" for size, chi_map in chi_maps.items() if chi_map.size)
+                + "\n"
+                "Пары значений (Вестфельд), p-value: "
+                + ", ".join(f"{int(fr * 100)}%: {p:.3f}" for fr, p in zip(fractions, p_values))
+                + "\n\n"
                 f"AUMP beta: {aump_val:.3f}\n\n"
                 + rs_text
             )
@@ -1,18 +1,14 @@
+import sys, os
 import numpy as np
 from PyQt6.QtGui import QImage
 import math
+from numpy.lib.stride_tricks import sliding_window_view
 
-def get_red(pixel: int) -> int:
-    return (pixel >> 16) & 0xff
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.qt_arrays import red_view
 
-def get_green(pixel: int) -> int:
-    return (pixel >> 8) & 0xff
-
-def get_blue(pixel: int) -> int:
-    return pixel & 0xff
-
-def get_pixel_colour(pixel: int, colour: int) -> int:
-    return get_red(pixel)
+# сколько строк начал групп обрабатывается за раз: ограничивает память при overlap=True
+RS_CHUNK_ROWS = 64
 
 def negate_lsb(byte: int) -> int:
     temp = byte & 0xFE
@@ -28,56 +24,16 @@ def invert_lsb(byte: int) -> int:
         return 255
     return negate_lsb(byte + 1) - 1
 
-def invert_mask(mask: list[int]) -> list[int]:
-    return [-m for m in mask]
-
-def flip_block(block: list[int], mask: list[int]) -> list[int]:
-    new_block = []
-    for i, pixel in enumerate(block):
-        val = get_pixel_colour(pixel, 0)
-        if mask[i] == 1:
-            val = negate_lsb(val)
-        elif mask[i] == -1:
-            val = invert_lsb(val)
-        new_pixel = (0xff << 24) | (val << 16) | (val << 8) | val
-        new_block.append(new_pixel)
-    return new_block
+# F1 и F-1 для всех 256 значений
+FLIP_POSITIVE = np.array([negate_lsb(v) for v in range(256)], dtype=np.int16)
+FLIP_NEGATIVE = np.array([invert_lsb(v) for v in range(256)], dtype=np.int16)
 
-def get_variation(block: list[int], colour: int) -> float:
-    var = 0
-    for i in range(0, len(block), 4):
-        if i + 3 < len(block):
-            c0 = get_pixel_colour(block[i], colour)
-            c1 = get_pixel_colour(block[i+1], colour)
-            c2 = get_pixel_colour(block[i+2], colour)
-            c3 = get_pixel_colour(block[i+3], colour)
-            var += abs(c0 - c1)
-            var += abs(c3 - c2)
-            var += abs(c1 - c3)
-            var += abs(c2 - c0)
-    return var
-
-def get_negative_variation(block: list[int], colour: int, mask: list[int]) -> float:
-    var = 0
-    for i in range(0, len(block), 4):
-        if i + 3 < len(block):
-            c0 = get_pixel_colour(block[i], colour)
-            c1 = get_pixel_colour(block[i+1], colour)
-            c2 = get_pixel_colour(block[i+2], colour)
-            c3 = get_pixel_colour(block[i+3], colour)
-            if mask[i] == -1:
-                c0 = invert_lsb(c0)
-            if mask[i+1] == -1:
-                c1 = invert_lsb(c1)
-            if mask[i+2] == -1:
-                c2 = invert_lsb(c2)
-            if mask[i+3] == -1:
-                c3 = invert_lsb(c3)
-            var += abs(c0 - c1)
-            var += abs(c3 - c2)
-            var += abs(c1 - c3)
-            var += abs(c2 - c0)
-    return var
+def get_variation(groups: np.ndarray) -> np.ndarray:
+    # группа берётся как плоский список по 4 подряд: |c0-c1| + |c3-c2| + |c1-c3| + |c2-c0|, хвост < 4 не учитывается
+    quads = groups.shape[1] // 4
+    c = groups[:, :4 * quads].reshape(len(groups), quads, 4)
+    c0, c1, c2, c3 = c[:, :, 0], c[:, :, 1], c[:, :, 2], c[:, :, 3]
+    return (np.abs(c0 - c1) + np.abs(c3 - c2) + np.abs(c1 - c3) + np.abs(c2 - c0)).sum(axis=1)
 
 def getX(r, rm, r1, rm1, s, sm, s1, sm1):
     dzero = r - s        
@@ -105,82 +61,63 @@ def getX(r, rm, r1, rm1, s, sm, s1, sm1):
         x = (cr + cs) / 2
     return x
 
-def create_masks_static(m: int, n: int) -> tuple[list[int], list[int]]:
-    mask_pos = []
-    mask_neg = []
-    for i in range(n):
-        for j in range(m):
-            if ((j % 2 == 0 and i % 2 == 0) or (j % 2 == 1 and i % 2 == 1)):
-                mask_pos.append(1)
-                mask_neg.append(0)
-            else:
-                mask_pos.append(0)
-                mask_neg.append(1)
-    return mask_pos, mask_neg
-
-def get_all_pixel_flips(image: QImage, colour: int, overlap: bool, m: int, n: int) -> list[float]:
-    imgx = image.width()
-    imgy = image.height()
-    allmask = [1] * (m * n)
-    startx = 0
-    starty = 0
-    block_size = m * n
+def group_origins(imgx: int, imgy: int, m: int, n: int, overlap: bool) -> tuple[np.ndarray, np.ndarray]:
+    # шаг 1 (overlap) или m/n, начала < размер - 1, только целиком помещающиеся группы;
+    # при высоте 1 обход останавливается после первой группы
+    if imgx <= 0 or imgy <= 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    step_x, step_y = (1, 1) if overlap else (m, n)
+    if imgy - 1 <= 0:
+        xs = ys = np.zeros(1, dtype=np.intp)
+    else:
+        xs = np.arange(0, max(imgx - 1, 1), step_x)
+        ys = np.arange(0, imgy - 1, step_y)
+    return xs[xs + m <= imgx], ys[ys + n <= imgy]
+
+def iter_groups(red: np.ndarray, m: int, n: int, overlap: bool):
+    # группы n x m как строки плоских значений (порядок: строка за строкой), без копирования всего изображения
+    imgy, imgx = red.shape
+    xs, ys = group_origins(imgx, imgy, m, n, overlap)
+    if not xs.size or not ys.size:
+        return
+    windows = sliding_window_view(red, (n, m))
+    for start in range(0, len(ys), RS_CHUNK_ROWS):
+        rows = ys[start:start + RS_CHUNK_ROWS]
+        yield windows[rows[:, None], xs[None, :]].reshape(-1, m * n).astype(np.int16)
+
+def get_all_pixel_flips(image: QImage, colour: int, overlap: bool, m: int, n: int, mask_pos: np.ndarray = None) -> list[float]:
+    if mask_pos is None:
+        mask_pos = RSAnalysis(m, n).mask_arrays[0]
     numregular = 0.0
     numsingular = 0.0
     numnegreg = 0.0
     numnegsing = 0.0
-
-    while startx < imgx and starty < imgy:
-        for _ in range(2):
-            block = []
-            for i in range(n):
-                for j in range(m):
-                    x = startx + j
-                    y = starty + i
-                    if x < imgx and y < imgy:
-                        pixel = image.pixel(x, y)
-                        block.append(pixel)
-            if len(block) < block_size:
-                continue
-            block_flipped = flip_block(block.copy(), allmask)
-            variationB = get_variation(block_flipped, colour)
-            mask_pos, mask_neg = create_masks_static(m, n)
-            current_mask = mask_pos
-            block_flipped_mask = flip_block(block.copy(), current_mask)
-            variationP = get_variation(block_flipped_mask, colour)
-            neg_mask = invert_mask(current_mask)
-            variationN = get_negative_variation(block, colour, neg_mask)
-            if variationP > variationB:
-                numregular += 1
-            elif variationP < variationB:
-                numsingular += 1
-            if variationN > variationB:
-                numnegreg += 1
-            elif variationN < variationB:
-                numnegsing += 1
-        if overlap:
-            startx += 1
-        else:
-            startx += m
-        if startx >= (imgx - 1):
-            startx = 0
-            if overlap:
-                starty += 1
-            else:
-                starty += n
-        if starty >= (imgy - 1):
-            break
-    return [numregular, numsingular, numnegreg, numnegsing]
+    for groups in iter_groups(red_view(image), m, n, overlap):
+        variationB = get_variation(FLIP_POSITIVE[groups])
+        variationP = get_variation(np.where(mask_pos, FLIP_POSITIVE[groups], groups))
+        variationN = get_variation(np.where(mask_pos, FLIP_NEGATIVE[groups], groups))
+        numregular += int(np.count_nonzero(variationP > variationB))
+        numsingular += int(np.count_nonzero(variationP < variationB))
+        numnegreg += int(np.count_nonzero(variationN > variationB))
+        numnegsing += int(np.count_nonzero(variationN < variationB))
+    # каждая группа учитывается дважды: две итерации с одной и той же mask_pos, как в do_analysis
+    return [2 * numregular, 2 * numsingular, 2 * numnegreg, 2 * numnegsing]
 
 class RSAnalysis:
     ANALYSIS_COLOUR_RED = 0
     ANALYSIS_COLOUR_GREEN = 1
     ANALYSIS_COLOUR_BLUE = 2
 
-    def __init__(self, m: int, n: int):
+    def __init__(self, m: int, n: int, mask=None):
+        # mask - необязательная маска n x m из 0/1 (по умолчанию шахматная), вторая маска - её дополнение
         self.mM = m
         self.mN = n
-        self.mMask = self.create_masks(m, n)
+        if mask is None:
+            self.mMask = self.create_masks(m, n)
+        else:
+            mask_pos = [1 if v else 0 for v in np.asarray(mask).reshape(n * m)]
+            self.mMask = [mask_pos, [1 - v for v in mask_pos]]
+        self.mask_arrays = [np.array(mask, dtype=bool) for mask in self.mMask]
 
     def create_masks(self, m: int, n: int) -> list[list[int]]:
         mask_pos = []
@@ -198,60 +135,29 @@ class RSAnalysis:
     def do_analysis(self, image: QImage, colour: int, overlap: bool) -> np.ndarray:
         imgx = image.width()
         imgy = image.height()
-        startx = 0
-        starty = 0
-        block_size = self.mM * self.mN
         numregular = 0.0
         numsingular = 0.0
         numnegreg = 0.0
         numnegsing = 0.0
         numunusable = 0.0
 
-        while startx < imgx and starty < imgy:
-            for m in range(2):
-                block = []
-                for i in range(self.mN):
-                    for j in range(self.mM):
-                        x = startx + j
-                        y = starty + i
-                        if x < imgx and y < imgy:
-                            pixel = image.pixel(x, y)
-                            block.append(pixel)
-                if len(block) < block_size:
-                    continue
-                variationB = get_variation(block, colour)
-                block_flipped = flip_block(block.copy(), self.mMask[m])
-                variationP = get_variation(block_flipped, colour)
-                block_restored = flip_block(block_flipped.copy(), self.mMask[m])
-                neg_mask = invert_mask(self.mMask[m])
-                variationN = get_negative_variation(block_restored, colour, neg_mask)
-                if variationP > variationB:
-                    numregular += 1
-                elif variationP < variationB:
-                    numsingular += 1
-                else:
-                    numunusable += 1
-                if variationN > variationB:
-                    numnegreg += 1
-                elif variationN < variationB:
-                    numnegsing += 1
-            if overlap:
-                startx += 1
-            else:
-                startx += self.mM
-            if startx >= (imgx - 1):
-                startx = 0
-                if overlap:
-                    starty += 1
-                else:
-                    starty += self.mN
-            if starty >= (imgy - 1):
-                break
+        for groups in iter_groups(red_view(image), self.mM, self.mN, overlap):
+            variationB = get_variation(groups)
+            positive = FLIP_POSITIVE[groups]
+            negative = FLIP_NEGATIVE[groups]
+            for mask in self.mask_arrays:
+                variationP = get_variation(np.where(mask, positive, groups))
+                variationN = get_variation(np.where(mask, negative, groups))
+                numregular += int(np.count_nonzero(variationP > variationB))
+                numsingular += int(np.count_nonzero(variationP < variationB))
+                numunusable += int(np.count_nonzero(variationP == variationB))
+                numnegreg += int(np.count_nonzero(variationN > variationB))
+                numnegsing += int(np.count_nonzero(variationN < variationB))
 
         total_groups = numregular + numsingular + numunusable + 1e-6
         rs_ratio = numregular / total_groups
 
-        allpixels = get_all_pixel_flips(image, colour, overlap, self.mM, self.mN)
+        allpixels = get_all_pixel_flips(image, colour, overlap, self.mM, self.mN, self.mask_arrays[0])
         x = getX(numregular, numnegreg, allpixels[0], allpixels[2],
                  numsingular, numnegsing, allpixels[1], allpixels[3])
         if (2 * (x - 1)) == 0:
@@ -0,0 +1,9 @@
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, *(os.path.join(ROOT, lab) for lab in ("lab1", "lab2", "lab3", "lab4", "lab5"))):
+    if path not in sys.path:
+        sys.path.insert(0, path)
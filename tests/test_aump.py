@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from common.qt_arrays import array_to_qimage
+from aump import aump_analysis, aump_projectors, pred_aump
+
+def reference_pred(X: np.ndarray, m: int, d: int):
+    # блоки по m пикселей в порядке обхода строк и МНК-полином степени d, как в исходной версии
+    q = d + 1
+    flat = X.ravel()
+    Kn = flat.size // m
+    H = np.vander(np.linspace(1 / m, 1, m), q, increasing=True)
+    Y = flat[:Kn * m].reshape(Kn, m).T
+    Ypred = H @ np.linalg.lstsq(H, Y, rcond=None)[0]
+    sig2 = np.maximum(1.0, np.sum((Y - Ypred) ** 2, axis=0) / (m - q))
+    s_n2 = Kn / np.sum(1.0 / sig2)
+    w_block = np.sqrt(s_n2 / (Kn * (m - q))) / sig2
+    return Ypred.T.ravel(), np.repeat(w_block, m)
+
+def reference_beta(gray: np.ndarray, m: int, d: int) -> float:
+    X = gray.astype(np.float64).ravel()
+    covered = X.size // m * m
+    Xpred, w = reference_pred(X[:covered], m, d)
+    sign = 2 * (X[:covered] % 2) - 1
+    return float(np.sum(w * sign * (X[:covered] - Xpred)))
+
+def smooth_gray(height: int, width: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    return np.clip(120 + 50 * np.sin(x / 5.0 + y / 7.0) + rng.normal(0, 3, (height, width)), 0, 255).astype(np.uint8)
+
+@pytest.mark.parametrize("m, d", [(16, 2), (8, 1), (12, 3)])
+def test_prediction_matches_reference(m, d):
+    X = smooth_gray(24, 32).astype(np.float64)
+    Xpred, w = pred_aump(X, m, d)
+    expected_pred, expected_w = reference_pred(X, m, d)
+    assert np.allclose(Xpred.ravel(), expected_pred, rtol=0, atol=1e-8)
+    assert np.allclose(w.ravel(), expected_w, rtol=1e-10)
+
+@pytest.mark.parametrize("shape", [(24, 32), (17, 13), (1, 50), (50, 1)])
+def test_beta_matches_reference(shape):
+    gray = smooth_gray(*shape, seed=shape[0])
+    assert aump_analysis(array_to_qimage(gray)) == pytest.approx(reference_beta(gray, 16, 2), rel=1e-9)
+
+def test_tail_pixels_are_ignored():
+    X = smooth_gray(5, 7).astype(np.float64)
+    Xpred, w = pred_aump(X, 16, 2)
+    assert np.array_equal(Xpred.ravel()[32:], X.ravel()[32:])
+    assert not w.ravel()[32:].any()
+
+def test_projector_cached_and_read_only():
+    residual = aump_projectors(16, 2)
+    assert aump_projectors(16, 2) is residual
+    assert not residual.flags.writeable
+    H = np.vander(np.linspace(1 / 16, 1, 16), 3, increasing=True)
+    assert np.allclose(residual @ H, 0, atol=1e-10)
+    assert aump_projectors(16, 2, np.float32).dtype == np.float32
+
+def test_float32_close_to_float64():
+    image = array_to_qimage(smooth_gray(40, 48, 2))
+    beta64 = aump_analysis(image)
+    beta32 = aump_analysis(image, dtype=np.float32)
+    assert isinstance(beta32, np.float32)
+    assert beta32 == pytest.approx(beta64, rel=1e-4)
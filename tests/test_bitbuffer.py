@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from common.bitbuffer import BitBuffer
+
+def reference_bits(data: bytes) -> list[int]:
+    # разбиение на биты из исходных text_to_bits
+    return [(byte >> (7 - i)) & 1 for byte in data for i in range(8)]
+
+def test_from_text_matches_reference():
+    text = "Привет, world!"
+    bits = BitBuffer.from_text(text, b"\x00")
+    assert list(bits) == reference_bits(text.encode("utf-8") + b"\x00")
+
+@pytest.mark.parametrize("length", [0, 1, 7, 8, 13, 64])
+def test_roundtrip_and_slices(length):
+    raw = np.random.default_rng(length).integers(0, 2, length, dtype=np.uint8)
+    bits = BitBuffer(raw)
+    assert len(bits) == length
+    assert np.array_equal(np.asarray(bits), raw)
+    for start, stop in ((0, length), (3, length), (0, length // 2), (8, length)):
+        assert np.array_equal(np.asarray(bits[start:stop]), raw[start:stop])
+
+def test_concatenation_keeps_bits():
+    left = BitBuffer([1, 0, 1])
+    right = BitBuffer.from_bytes(b"\xf0")
+    assert list(left + right) == [1, 0, 1] + reference_bits(b"\xf0")
+    assert list(BitBuffer.from_bytes(b"\x80") + left) == reference_bits(b"\x80") + [1, 0, 1]
+
+def test_partial_byte_padding_is_zero():
+    bits = BitBuffer.from_bytes(b"\xff", 3)
+    assert bits.to_bytes() == b"\xe0"
+    assert bits == BitBuffer([1, 1, 1])
+    assert bits.find_marker(b"\xe0") == 0
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from common.bitplanes import (PackedBitPlanes, bit_planes, iter_gray_strips, save_packed_planes,
+                              stream_packed_planes)
+from common.qt_arrays import array_to_qimage
+from export_bits import export_image, main as export_main
+
+def random_gray(height: int, width: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (height, width), dtype=np.uint8)
+
+def write_pgm(path, gray: np.ndarray, truncate: int = 0) -> None:
+    height, width = gray.shape
+    data = f"P5\n# test\n{width} {height}\n255\n".encode() + gray.tobytes()
+    path.write_bytes(data[:len(data) - truncate])
+
+def test_packed_planes_roundtrip(tmp_path):
+    gray = random_gray(37, 45)
+    path = str(tmp_path / "planes.bpl")
+    save_packed_planes(path, gray)
+    planes = PackedBitPlanes(path)
+    assert (planes.width, planes.height) == (45, 37)
+    expected = bit_planes(gray)
+    for b in range(8):
+        assert np.array_equal(planes.plane(b), expected[b])
+
+@pytest.mark.parametrize("suffix", ["pgm", "png", "bmp"])
+def test_strips_cover_image(tmp_path, suffix):
+    gray = random_gray(70, 33, 1)
+    path = tmp_path / f"image.{suffix}"
+    if suffix == "pgm":
+        write_pgm(path, gray)
+    else:
+        assert array_to_qimage(gray).save(str(path))
+    strips = list(iter_gray_strips(str(path), 16))
+    assert [y for y, _ in strips] == list(range(0, 70, 16))
+    assert np.array_equal(np.concatenate([s for _, s in strips]), gray)
+
+@pytest.mark.parametrize("suffix", ["pgm", "png"])
+def test_stream_matches_packed(tmp_path, suffix):
+    gray = random_gray(50, 40, 2)
+    path = tmp_path / f"image.{suffix}"
+    if suffix == "pgm":
+        write_pgm(path, gray)
+    else:
+        assert array_to_qimage(gray).save(str(path))
+    save_packed_planes(str(tmp_path / "full.bpl"), gray)
+    stream_packed_planes(str(path), str(tmp_path / "strips.bpl"), 16)
+    assert (tmp_path / "full.bpl").read_bytes() == (tmp_path / "strips.bpl").read_bytes()
+
+def test_truncated_pgm_fails_softly(tmp_path, capsys):
+    source_dir = tmp_path / "in"
+    output_dir = tmp_path / "out"
+    source_dir.mkdir()
+    output_dir.mkdir()
+    path = source_dir / "broken.pgm"
+    write_pgm(path, random_gray(20, 20), truncate=10)
+    with pytest.raises(OSError):
+        list(iter_gray_strips(str(path)))
+    output = str(output_dir / "broken_bits.bpl")
+    assert export_image((str(path), [output], True, 8)) == (str(path), False)
+    assert os.listdir(output_dir) == []
+    # недописанный файл не должен считаться актуальным: повторный запуск снова берёт изображение
+    for _ in range(2):
+        assert export_main([str(source_dir), str(output_dir), "-s", "8", "-j", "1"]) == 1
+        assert "к обработке: 1" in capsys.readouterr().out
+        assert os.listdir(output_dir) == []
@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pytest
+
+from common.qt_arrays import array_to_qimage
+from chi_square import (DENSE_MIN_BLOCK_PIXELS, PYRAMID_BLOCK_SIZES, block_histograms, chi2_sf, chi_square_analysis,
+                        chi_square_pyramid, pairs_of_values_curve, pairs_of_values_pvalue)
+
+def reference_chi(arr: np.ndarray, block_size: int) -> np.ndarray:
+    # поблочные np.histogram из исходной версии
+    rows, cols = arr.shape[0] // block_size, arr.shape[1] // block_size
+    chi = np.zeros((rows, cols))
+    for i in range(rows):
+        for j in range(cols):
+            block = arr[i * block_size:(i + 1) * block_size, j * block_size:(j + 1) * block_size]
+            observed, _ = np.histogram(block, bins=256, range=(0, 256))
+            expected = block.size / 256
+            chi[i, j] = np.sum((observed - expected) ** 2 / expected)
+    return chi
+
+def random_gray(height: int, width: int, seed: int = 0) -> np.ndarray:
+    # ширина кратна 4: image_to_array не учитывает выравнивание строк QImage
+    return np.random.default_rng(seed).integers(0, 256, (height, width), dtype=np.uint8)
+
+@pytest.mark.parametrize("block_size", [2, 4, 8, 12, 16, 24, 32])
+def test_chi_square_matches_reference(block_size):
+    gray = random_gray(70, 100, block_size)
+    chi = chi_square_analysis(array_to_qimage(gray), block_size)
+    assert np.allclose(chi, reference_chi(gray, block_size), rtol=1e-12, atol=1e-9)
+
+def test_both_paths_exercised():
+    assert 8 * 8 < DENSE_MIN_BLOCK_PIXELS <= 16 * 16
+
+def test_block_histograms_counts():
+    gray = random_gray(33, 48, 1)
+    hist = block_histograms(gray, 16)
+    assert hist.shape == (2, 3, 256)
+    assert np.array_equal(hist[1, 2], np.bincount(gray[16:32, 32:48].ravel(), minlength=256))
+
+def test_image_smaller_than_block():
+    assert chi_square_analysis(array_to_qimage(random_gray(4, 8)), 16).shape == (0, 0)
+
+@pytest.mark.parametrize("block_sizes", [PYRAMID_BLOCK_SIZES, (4, 8), (8, 32), (16, 64), (2, 4, 8, 16, 32)])
+def test_pyramid_levels_match_direct_analysis(block_sizes):
+    image = array_to_qimage(random_gray(150, 136, 2))
+    maps = chi_square_pyramid(image, block_sizes)
+    assert sorted(maps) == sorted(block_sizes)
+    for size, chi in maps.items():
+        assert np.allclose(chi, chi_square_analysis(image, size), rtol=1e-12, atol=1e-9)
+
+def test_pyramid_rejects_unrelated_sizes():
+    with pytest.raises(ValueError):
+        chi_square_pyramid(array_to_qimage(random_gray(64, 64)), (8, 24))
+
+def test_chi2_sf_known_values():
+    # для df = 2 хвост равен exp(-x / 2)
+    for x in (0.1, 1.0, 5.0, 40.0):
+        assert chi2_sf(x, 2) == pytest.approx(math.exp(-x / 2), rel=1e-10)
+    assert chi2_sf(0.0, 10) == 1.0
+    assert chi2_sf(9.34182, 10) == pytest.approx(0.5, abs=1e-5)
+
+def test_pairs_of_values_curve_matches_prefixes():
+    gray = random_gray(30, 40, 3)
+    fractions, p_values = pairs_of_values_curve(array_to_qimage(gray), steps=7)
+    assert np.allclose(fractions, np.arange(1, 8) / 7)
+    values = gray.ravel()
+    for k, p_value in enumerate(p_values, 1):
+        # k-я точка - первые ceil(k * n / steps) пикселей
+        prefix = values[:-(-k * values.size // 7)]
+        expected = pairs_of_values_pvalue(np.bincount(prefix, minlength=256))
+        assert p_value == pytest.approx(expected, rel=1e-12, abs=1e-15)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from common.bitbuffer import BitBuffer
+from common.qt_arrays import array_to_qimage, gray_view
+from lab4 import (LENGTH_HEADER_BITS, MESSAGE_PADDING_BITS, embed_imnp, embedded_bits, extract_imnp,
+                  extract_imnp_message, with_length_header)
+
+def reference_embed(gray: np.ndarray, bits: list[int]):
+    # попиксельный IMNP из исходной версии lab4
+    gray = gray.astype(int)
+    height, width = gray.shape
+    stego = gray.copy()
+    positions = []
+    bit_index = 0
+    for y in range(0, height - 2, 2):
+        for x in range(0, width - 2, 2):
+            p00, p02, p20, p22 = gray[y, x], gray[y, x + 2], gray[y + 2, x], gray[y + 2, x + 2]
+            omin = min(p00, p02, p20, p22)
+            omax = max(p00, p02, p20, p22)
+            c01 = (omax + (p00 + p20) // 2) // 2
+            c10 = (omax + (p00 + p02) // 2) // 2
+            c11 = (c01 + c10) // 2
+            for dx, dy, c, ref in ((0, 1, c01, max(p00, p20)), (1, 0, c10, max(p00, p02)), (1, 1, c11, min(c10, c01))):
+                vk = int(c - omin)
+                ak = vk.bit_length() - 1 if vk > 0 else 0
+                value = c
+                if ak > 0 and bit_index + ak <= len(bits):
+                    rk = 0
+                    for b in bits[bit_index:bit_index + ak]:
+                        rk = (rk << 1) | b
+                    bit_index += ak
+                    value = min(max(ref - rk, 0), 255)
+                    positions.append((x + dx, y + dy))
+                stego[y + dy, x + dx] = value
+    return stego.astype(np.uint8), positions
+
+def smooth_gray(height: int, width: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = 100 + 60 * np.sin(x / 7.0) * np.cos(y / 9.0)
+    return np.clip(base + rng.normal(0, 12, (height, width)), 0, 255).astype(np.uint8)
+
+def random_bits(n: int, seed: int = 1) -> BitBuffer:
+    return BitBuffer(np.random.default_rng(seed).integers(0, 2, n, dtype=np.uint8))
+
+def test_embed_matches_reference():
+    gray = smooth_gray(31, 42)
+    bits = random_bits(500)
+    stego, _, positions = embed_imnp(array_to_qimage(gray), bits)
+    expected, expected_positions = reference_embed(gray, list(np.asarray(bits)))
+    assert np.array_equal(gray_view(stego), expected)
+    assert [tuple(p) for p in positions] == expected_positions
+
+@pytest.mark.parametrize("n_bits", [0, 3, 8, 200])
+def test_message_roundtrip(n_bits):
+    gray = smooth_gray(40, 64, 3)
+    bits = random_bits(n_bits, n_bits)
+    framed = with_length_header(bits)
+    assert len(framed) == LENGTH_HEADER_BITS + n_bits + MESSAGE_PADDING_BITS
+    assert embedded_bits(gray, len(framed)) == len(framed)
+    stego, _, _ = embed_imnp(array_to_qimage(gray), framed)
+    assert extract_imnp_message(stego) == bits
+    assert extract_imnp(stego, n_bits=len(framed)) == framed
+
+def test_capacity_overflow_detected():
+    gray = smooth_gray(12, 12)
+    framed = with_length_header(random_bits(4000))
+    assert embedded_bits(gray, len(framed)) < len(framed)
+
+@pytest.mark.parametrize("n_bits", [0, 300, 4000])
+def test_parallel_matches_serial(monkeypatch, n_bits):
+    import gc
+    import lab4
+    monkeypatch.setattr(lab4, "STRIP_BLOCK_ROWS", 3)
+    gray = smooth_gray(45, 38, 5)
+    cover = array_to_qimage(gray)
+    framed = with_length_header(random_bits(n_bits, 7))
+    stego, inter, positions = embed_imnp(cover, framed)
+    par_stego, par_inter, par_positions = lab4.embed_imnp_parallel(cover, framed, 2)
+    gc.collect()
+    assert np.array_equal(gray_view(par_stego), gray_view(stego))
+    assert np.array_equal(gray_view(par_inter), gray_view(inter))
+    assert np.array_equal(par_positions, positions)
+    assert lab4.extract_imnp_message(par_stego, 2) == extract_imnp_message(stego)
+
+def test_parallel_refuses_overflow(monkeypatch):
+    import lab4
+    monkeypatch.setattr(lab4, "STRIP_BLOCK_ROWS", 3)
+    gray = smooth_gray(45, 38, 5)
+    strips = lab4.strip_ranges(lab4.block_rows(gray), 2)
+    capacities = [int(lab4.imnp_blocks(gray, first, last).ak.sum()) for first, last in strips]
+    for n_bits in (100, 4000, 6000):
+        _, planned = lab4.plan_strips(gray, strips, capacities, n_bits)
+        assert planned == embedded_bits(gray, n_bits)
+    framed = with_length_header(random_bits(6000, 7))
+    stego, inter, positions = lab4.embed_imnp_parallel(array_to_qimage(gray), framed, 2)
+    assert stego.isNull() and inter.isNull() and len(positions) == 0
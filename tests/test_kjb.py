@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from common.bitbuffer import BitBuffer
+from common.qt_arrays import array_to_qimage, rgb_view
+from keyed_permutation import keyed_permutation
+from lab2 import (brightness, embed_kjb, extract_kjb_payload, extract_kjb_text, iter_kjb_bits,
+                  text_to_bits_with_marker)
+
+def reference_embed(rgb: np.ndarray, bits: list[int], lam: float, indices: np.ndarray) -> np.ndarray:
+    # попиксельный КДБ из исходной версии lab2 на том же наборе индексов
+    result = rgb.copy()
+    width = rgb.shape[1]
+    for bit, index in zip(bits, indices):
+        y, x = divmod(int(index), width)
+        r, g, b = (int(v) for v in result[y, x])
+        luma = brightness(r, g, b)
+        b_new = b + lam * luma if bit == 1 else b - lam * luma
+        result[y, x, 2] = int(max(0, min(255, b_new)))
+    return result
+
+def random_rgb(height: int, width: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+@pytest.mark.parametrize("shape", [(9, 13), (1, 40), (40, 1)])
+@pytest.mark.parametrize("fill", [0.3, 1.0])
+def test_embed_matches_reference(shape, fill):
+    rgb = random_rgb(*shape, seed=shape[0])
+    n = int(rgb.shape[0] * rgb.shape[1] * fill)
+    bits = BitBuffer(np.random.default_rng(n).integers(0, 2, n, dtype=np.uint8))
+    stego, used = embed_kjb(array_to_qimage(rgb), bits, 0.1, 42)
+    assert np.array_equal(used, keyed_permutation(rgb.shape[0] * rgb.shape[1], 42).take(n))
+    assert np.array_equal(rgb_view(stego), reference_embed(rgb, list(bits), 0.1, used))
+
+def test_embed_refuses_over_capacity():
+    stego, used = embed_kjb(array_to_qimage(random_rgb(3, 3)), BitBuffer.zeros(10), 0.1, 1)
+    assert stego.isNull() and len(used) == 0
+
+def test_permutation_is_bijection():
+    for n in (1, 2, 17, 1000):
+        assert np.array_equal(np.sort(keyed_permutation(n, 5).take(n)), np.arange(n))
+
+def reference_decisions(rgb: np.ndarray, indices: np.ndarray) -> list[int]:
+    # попиксельное извлечение из исходной версии lab2: синий против среднего по соседям
+    blue = rgb[:, :, 2].astype(int)
+    height, width = blue.shape
+    bits = []
+    for index in indices:
+        y, x = divmod(int(index), width)
+        neighbors = []
+        if x > 0:
+            neighbors.append(blue[y, x - 1])
+        if x < width - 1:
+            neighbors.append(blue[y, x + 1])
+        if y > 0:
+            neighbors.append(blue[y - 1, x])
+        if y < height - 1:
+            neighbors.append(blue[y + 1, x])
+        estimate = sum(neighbors) / len(neighbors) if neighbors else blue[y, x]
+        bits.append(1 if blue[y, x] >= estimate else 0)
+    return bits
+
+@pytest.mark.parametrize("shape", [(9, 13), (1, 40), (40, 1), (1, 1)])
+def test_extracted_bits_match_reference(shape):
+    rgb = random_rgb(*shape, seed=7)
+    total = rgb.shape[0] * rgb.shape[1]
+    bits = np.concatenate(list(iter_kjb_bits(array_to_qimage(rgb), 3, chunk_size=5)))
+    assert list(bits) == reference_decisions(rgb, keyed_permutation(total, 3).take(total))
+
+def test_payload_roundtrip():
+    # ровный фон и сильная модуляция: бит 1 поднимает синий, бит 0 опускает его ниже соседей
+    rgb = np.full((64, 64, 3), 128, dtype=np.uint8)
+    message = "Сообщение"
+    stego, _ = embed_kjb(array_to_qimage(rgb), text_to_bits_with_marker(message), 0.5, 11)
+    assert extract_kjb_payload(stego, 11) == message.encode("utf-8")
+    assert extract_kjb_text(stego, 11) == message
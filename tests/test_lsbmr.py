@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from common.bitbuffer import BitBuffer
+from common.qt_arrays import array_to_qimage, gray_view
+from lab3 import (embed_lsb_matching_revisited, embed_rate_sweep, extract_lsb_matching_revisited,
+                  extract_lsb_matching_revisited_payload, extract_lsb_matching_revisited_text, f,
+                  iter_lsb_matching_revisited_bits, lsbmr_tables, text_to_bits_with_marker)
+
+def adjust_first_pixel(pixel, constant, target_m):
+    candidate_minus = pixel - 1 if pixel > 0 else None
+    candidate_plus = pixel + 1 if pixel < 255 else None
+    if candidate_minus is not None and f(candidate_minus, constant) == target_m:
+        return candidate_minus
+    if candidate_plus is not None and f(candidate_plus, constant) == target_m:
+        return candidate_plus
+    return candidate_plus if candidate_plus is not None else candidate_minus
+
+def adjust_second_pixel(pixel, constant, target_m):
+    candidate_minus = pixel - 1 if pixel > 0 else None
+    candidate_plus = pixel + 1 if pixel < 255 else None
+    order = (candidate_plus, candidate_minus) if pixel % 2 == 0 else (candidate_minus, candidate_plus)
+    for candidate in order:
+        if candidate is not None and f(constant, candidate) == target_m:
+            return candidate
+    return candidate_plus if candidate_plus is not None else candidate_minus
+
+def reference_pair(pixel1, pixel2, m1, m2):
+    # решение для одной пары из исходной версии lab3
+    if (pixel1 & 1) != m1:
+        return adjust_first_pixel(pixel1, pixel2, m2), pixel2
+    if f(pixel1, pixel2) == m2:
+        return pixel1, pixel2
+    return pixel1, adjust_second_pixel(pixel2, pixel1, m2)
+
+def reference_embed(gray: np.ndarray, bits: list[int]) -> np.ndarray:
+    pixels = gray.reshape(-1).astype(int)
+    for i in range(0, len(bits), 2):
+        m2 = bits[i + 1] if i + 1 < len(bits) else 0
+        pixels[i], pixels[i + 1] = reference_pair(pixels[i], pixels[i + 1], bits[i], m2)
+    return pixels.reshape(gray.shape).astype(np.uint8)
+
+def random_gray(height: int, width: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (height, width), dtype=np.uint8)
+
+def random_bits(n: int, seed: int = 1) -> BitBuffer:
+    return BitBuffer(np.random.default_rng(seed).integers(0, 2, n, dtype=np.uint8))
+
+def test_tables_match_reference():
+    new1, new2 = lsbmr_tables()
+    index = 0
+    for p1 in range(256):
+        for p2 in range(256):
+            for m1 in (0, 1):
+                for m2 in (0, 1):
+                    assert (new1[index], new2[index]) == reference_pair(p1, p2, m1, m2)
+                    index += 1
+
+@pytest.mark.parametrize("shape", [(7, 9), (1, 31), (31, 1), (6, 8)])
+@pytest.mark.parametrize("fill", [0.5, 1.0])
+def test_embed_matches_reference(shape, fill):
+    gray = random_gray(*shape, seed=shape[1])
+    capacity = gray.size - gray.size % 2
+    n = int(capacity * fill) | 1 if fill < 1 else capacity
+    bits = random_bits(n, n)
+    stego, _ = embed_lsb_matching_revisited(array_to_qimage(gray), bits)
+    assert np.array_equal(gray_view(stego), reference_embed(gray, list(bits)))
+
+def test_embed_refuses_over_capacity():
+    stego, used = embed_lsb_matching_revisited(array_to_qimage(random_gray(3, 3)), BitBuffer.zeros(9))
+    assert stego.isNull() and len(used) == 0
+
+def reference_extract(gray: np.ndarray) -> list[int]:
+    pixels = gray.reshape(-1).astype(int)
+    bits = []
+    for i in range(0, pixels.size - 1, 2):
+        bits += [pixels[i] & 1, f(pixels[i], pixels[i + 1])]
+    return bits
+
+@pytest.mark.parametrize("shape", [(7, 9), (1, 31), (31, 1), (5, 1)])
+def test_extract_matches_reference(shape):
+    gray = random_gray(*shape, seed=3)
+    stego = array_to_qimage(gray)
+    expected = reference_extract(gray)
+    assert list(extract_lsb_matching_revisited(stego)) == expected
+    assert list(extract_lsb_matching_revisited(stego, max_pairs=5)) == expected[:10]
+    chunks = list(iter_lsb_matching_revisited_bits(stego, chunk_pairs=2, max_chunk_pairs=4))
+    assert list(np.concatenate(chunks)) == expected
+
+@pytest.mark.parametrize("shape", [(7, 9), (1, 31), (31, 1)])
+def test_roundtrip_at_capacity(shape):
+    gray = random_gray(*shape, seed=4)
+    capacity = gray.size - gray.size % 2
+    bits = random_bits(capacity, 5)
+    stego, _ = embed_lsb_matching_revisited(array_to_qimage(gray), bits)
+    assert extract_lsb_matching_revisited(stego) == bits
+
+def test_message_roundtrip():
+    message = "Проверка LSBMR"
+    stego, _ = embed_lsb_matching_revisited(array_to_qimage(random_gray(33, 17)), text_to_bits_with_marker(message))
+    assert extract_lsb_matching_revisited_payload(stego) == message.encode("utf-8")
+    assert extract_lsb_matching_revisited_text(stego) == message
+
+@pytest.mark.parametrize("shape", [(7, 9), (6, 8)])
+def test_rate_sweep_matches_per_rate_embed(shape):
+    gray = random_gray(*shape, seed=6)
+    cover = array_to_qimage(gray)
+    capacity = gray.size - gray.size % 2
+    bits = random_bits(capacity, 7)
+    counts = [0, 1, 5, capacity // 2, capacity - 1, capacity, capacity + 2]
+    for n, stego in zip(counts, embed_rate_sweep(cover, bits, counts)):
+        if n > capacity:
+            assert stego.isNull()
+            continue
+        expected, _ = embed_lsb_matching_revisited(cover, bits[:n])
+        assert np.array_equal(gray_view(stego), gray_view(expected))
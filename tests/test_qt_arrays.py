@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from common.qt_arrays import ImageHandle, array_to_qimage, gray_view, rgb_view
+
+def test_handle_view_cached():
+    handle = ImageHandle(array_to_qimage(np.full((4, 6, 3), 10, dtype=np.uint8)))
+    assert gray_view(handle) is gray_view(handle)
+
+def test_handle_invalidate_after_write():
+    handle = ImageHandle(array_to_qimage(np.zeros((4, 6, 3), dtype=np.uint8)))
+    assert gray_view(handle).sum() == 0
+    writable = rgb_view(handle, writable=True)
+    writable[:] = 200
+    handle.invalidate()
+    assert np.all(gray_view(handle) == 200)
+
+def test_writable_view_requires_matching_format():
+    image = array_to_qimage(np.zeros((4, 6, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        gray_view(image, writable=True)
+    with pytest.raises(ValueError):
+        gray_view(ImageHandle(image), writable=True)
+    rgb_view(image, writable=True)[:] = 7
+    assert np.all(rgb_view(image) == 7)
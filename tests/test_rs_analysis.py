@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from common.qt_arrays import array_to_qimage
+from rs_analysis import (FLIP_NEGATIVE, FLIP_POSITIVE, RSAnalysis, get_all_pixel_flips, getX, invert_lsb, iter_groups,
+                         negate_lsb)
+
+def variation(values: list[int]) -> int:
+    total = 0
+    for i in range(0, len(values) - 3, 4):
+        c0, c1, c2, c3 = values[i:i + 4]
+        total += abs(c0 - c1) + abs(c3 - c2) + abs(c1 - c3) + abs(c2 - c0)
+    return total
+
+def flipped(values: list[int], mask: list[int], flip) -> list[int]:
+    return [flip(v) if k else v for v, k in zip(values, mask)]
+
+def reference_counts(gray: np.ndarray, m: int, n: int, overlap: bool, masks: list[list[int]]):
+    # обход групп и подсчёт R/S из исходной версии do_analysis и get_all_pixel_flips
+    imgy, imgx = gray.shape
+    counts = np.zeros(9)
+    startx = starty = 0
+    while startx < imgx and starty < imgy:
+        for mask in masks:
+            if startx + m > imgx or starty + n > imgy:
+                continue
+            block = gray[starty:starty + n, startx:startx + m].astype(int).ravel().tolist()
+            base = variation(block)
+            positive = variation(flipped(block, mask, negate_lsb))
+            negative = variation(flipped(block, mask, invert_lsb))
+            counts[0] += positive > base
+            counts[1] += positive < base
+            counts[2] += negative > base
+            counts[3] += negative < base
+            counts[4] += positive == base
+            all_flipped = variation(flipped(block, [1] * len(block), negate_lsb))
+            positive = variation(flipped(block, masks[0], negate_lsb))
+            negative = variation(flipped(block, masks[0], invert_lsb))
+            counts[5] += positive > all_flipped
+            counts[6] += positive < all_flipped
+            counts[7] += negative > all_flipped
+            counts[8] += negative < all_flipped
+        startx += 1 if overlap else m
+        if startx >= imgx - 1:
+            startx = 0
+            starty += 1 if overlap else n
+        if starty >= imgy - 1:
+            break
+    return counts
+
+def random_gray(height: int, width: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (height, width), dtype=np.uint8)
+
+def test_flip_tables():
+    assert FLIP_POSITIVE.tolist() == [negate_lsb(v) for v in range(256)]
+    assert FLIP_NEGATIVE.tolist() == [invert_lsb(v) for v in range(256)]
+
+@pytest.mark.parametrize("overlap", [False, True])
+@pytest.mark.parametrize("m, n, mask", [
+    (2, 2, None),
+    (3, 2, [[1, 0, 0], [0, 1, 1]]),
+    (4, 1, [[0, 1, 1, 0]]),
+    (2, 3, [[1, 1], [0, 0], [1, 0]]),
+])
+def test_results_match_reference(m, n, mask, overlap):
+    gray = random_gray(13, 16, m * 10 + n)
+    analyzer = RSAnalysis(m, n, mask)
+    results = analyzer.do_analysis(array_to_qimage(gray), RSAnalysis.ANALYSIS_COLOUR_RED, overlap)
+    counts = reference_counts(gray, m, n, overlap, analyzer.mMask)
+    r, s, rm, sm, unusable, r1, s1, rm1, sm1 = counts
+    assert results[:4].tolist() == [r, s, rm, sm]
+    assert results[12:16].tolist() == [r1, s1, rm1, sm1]
+    total = r + s + unusable + 1e-6
+    assert results[24] == pytest.approx(total)
+    x = getX(r, rm, r1, rm1, s, sm, s1, sm1)
+    assert results[25] == pytest.approx(abs(x / (2 * (x - 1))))
+    assert results[26] == pytest.approx(abs(x / (x - 0.5)))
+
+def test_custom_mask_complement():
+    analyzer = RSAnalysis(3, 2, [[1, 0, 0], [0, 1, 1]])
+    assert analyzer.mMask == [[1, 0, 0, 0, 1, 1], [0, 1, 1, 1, 0, 0]]
+    assert RSAnalysis(2, 2).mMask == [[1, 0, 0, 1], [0, 1, 1, 0]]
+
+@pytest.mark.parametrize("shape", [(1, 16), (5, 2), (2, 9)])
+@pytest.mark.parametrize("overlap", [False, True])
+def test_thin_images_match_reference(shape, overlap):
+    # на тонких изображениях getX часто делит на ноль, поэтому сравниваются сами счётчики
+    gray = random_gray(*shape, 3)
+    analyzer = RSAnalysis(2, 1, [[1, 0]])
+    counts = reference_counts(gray, 2, 1, overlap, analyzer.mMask)
+    flips = get_all_pixel_flips(array_to_qimage(gray), RSAnalysis.ANALYSIS_COLOUR_RED, overlap, 2, 1,
+                                analyzer.mask_arrays[0])
+    assert flips == counts[5:].tolist()
+    groups = sum(len(g) for g in iter_groups(gray, 2, 1, overlap))
+    assert 2 * groups == counts[[0, 1, 4]].sum()
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from common.bitbuffer import BitBuffer
+from common import scoring
+from common.scoring import EDIT_DISTANCE_MAX, edit_distance, score_extraction, score_message
+
+def reference_edit_distance(a: bytes, b: bytes) -> int:
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        prev, row[0] = row[0], i
+        for j, cb in enumerate(b, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ca != cb))
+    return row[-1]
+
+def test_single_flipped_bit():
+    original = "Привет, мир!".encode("utf-8")
+    damaged = bytearray(original)
+    damaged[1] ^= 0x10
+    score = score_extraction(original, bytes(damaged))
+    assert score.bit_errors == 1
+    assert score.total_bits == len(original) * 8
+    assert score.ber == pytest.approx(1 / (len(original) * 8))
+    assert score.length_diff == 0
+
+def test_bitbuffer_payload():
+    original = BitBuffer.from_bytes(b"abc")
+    extracted = BitBuffer.from_bytes(b"abc")[:20]
+    score = score_extraction(original, extracted)
+    assert score.bit_errors == 4
+    assert score.length_diff == 4
+
+def test_edit_distance_matches_reference():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        a = rng.integers(0, 3, rng.integers(0, 12), dtype=np.uint8).tobytes()
+        b = rng.integers(0, 3, rng.integers(0, 12), dtype=np.uint8).tobytes()
+        assert edit_distance(a, b) == reference_edit_distance(a, b)
+
+def test_edit_distance_cap():
+    assert edit_distance(b"a" * 10, b"b" * 10, max_distance=3) is None
+    assert edit_distance(b"", b"x" * (EDIT_DISTANCE_MAX + 1)) is None
+
+def count_runs(monkeypatch) -> list:
+    calls = []
+    common_run = scoring._common_run
+    def counted(*args):
+        calls.append(args)
+        return common_run(*args)
+    monkeypatch.setattr(scoring, "_common_run", counted)
+    return calls
+
+def test_edit_distance_work_bounded_by_distance(monkeypatch):
+    calls = count_runs(monkeypatch)
+    rng = np.random.default_rng(2)
+    original = rng.integers(0, 256, 100_000, dtype=np.uint8).tobytes()
+    damaged = original[:30_000] + original[30_005:70_000] + b"xyz" + original[70_000:]
+    assert edit_distance(original, damaged) == 5 + 3
+    # Ландау-Вишкин: не больше (2d + 1) продолжений диагоналей на каждую правку d
+    assert len(calls) <= sum(2 * d + 1 for d in range(9))
+
+def test_edit_distance_stops_at_cap(monkeypatch):
+    calls = count_runs(monkeypatch)
+    rng = np.random.default_rng(3)
+    a = rng.integers(0, 256, 100_000, dtype=np.uint8).tobytes()
+    b = rng.integers(0, 256, 100_000, dtype=np.uint8).tobytes()
+    assert edit_distance(a, b, max_distance=10) is None
+    assert len(calls) <= sum(2 * d + 1 for d in range(11))
+    calls.clear()
+    score = score_extraction(a, a[:50_000])
+    assert score.edit_distance is None
+    assert calls == []
+
+def test_score_message_uses_payload_bytes():
+    text = "Привет"
+    damaged = bytearray(text.encode("utf-8"))
+    damaged[0] ^= 0x01
+    score = score_message(text, bytes(damaged))
+    assert score.bit_errors == 1
+    assert score_message(text, b"") is None
+    assert score_message("", b"abc") is None